@@ -0,0 +1,237 @@
+"""
+Benchmarks for the Lahendus plug-in.
+
+rendering: Renders the DemoExerciseProvider benchmark pages into a HtmlText and reports
+how long parsing (worker thread part) and inserting (UI thread part) take. "render" is parsing
+plus inserting, ie. the time from having the HTML until the page is in the widget. On a tree
+without the display list (before parsing was moved to the worker thread) only "render" gets
+measured, so running this script in a checkout of an older revision gives the baseline.
+
+compare: Runs the rendering benchmark in a temporary git worktree of given revision (the baseline)
+and then in the current tree.
+
+startup: Reports (for fresh interpreters) how much importing the plug-in adds to Thonny's
+startup and how long it takes from the import until the first page is painted in the view.
+
+Usage: python benchmark.py [rendering|startup] [repetitions]
+       python benchmark.py compare <baseline revision> [repetitions]
+
+Needs Thonny and a display (rendering benchmark creates a Tk window, but doesn't show it).
+Without a display (eg. on a server) Xvfb gets started, if it's installed.
+"""
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tkinter as tk
+
+
+def _prepare_thonny_styles():
+    # HtmlText takes colors from Thonny's syntax options, which are normally set up by the workbench
+    from thonny import codeview
+    codeview._syntax_options.setdefault("TEXT", {"background": "white", "foreground": "black"})
+    codeview._syntax_options.setdefault("GUTTER", {"background": "#e0e0e0"})
+
+
+def _create_html_text(root):
+    from thonnycontrib.easy.htmltext import HtmlText, HtmlRenderer
+
+    class BenchmarkRenderer(HtmlRenderer):
+        def _get_image(self, name):
+            return None
+
+    return HtmlText(root, renderer_class=BenchmarkRenderer, link_and_form_handler=None,
+                    image_requester=None, read_only=True, wrap="word")
+
+
+def _measure(func, repetitions):
+    times = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def benchmark_rendering(repetitions):
+    from thonnycontrib.easy.demo_exercise_provider import DemoExerciseProvider
+    from thonnycontrib.easy import htmltext
+
+    root = tk.Tk()
+    root.withdraw()
+    _prepare_thonny_styles()
+    html_text = _create_html_text(root)
+    html_text.pack()
+
+    provider = DemoExerciseProvider(None)
+    pages = {
+        "benchmark_page1": provider._get_benchmark_page1(),
+        "benchmark_page2": provider._get_benchmark_page2(),
+    }
+
+    print("%-20s %10s %10s %10s %10s" % ("page", "parse ms", "insert ms", "render ms", "sync ms"))
+    for name, html in pages.items():
+
+        def set_and_update(content=html):
+            html_text.set_html_content(content)
+            root.update_idletasks()
+
+        if not hasattr(htmltext, "parse_html"):
+            # baseline, parsing and inserting can't be separated
+            sync_time = _measure(set_and_update, repetitions)
+            print("%-20s %10s %10s %10.2f %10.2f" % (name, "-", "-", sync_time, sync_time))
+            continue
+
+        display_list = htmltext.parse_html(html, cache=None)
+
+        def insert_and_update(content=display_list):
+            html_text.set_display_list(content)
+            root.update_idletasks()
+
+        def render_and_update(content=html):
+            # as in ExercisesView, without the thread switch
+            html_text.set_display_list(htmltext.parse_html(content, cache=None))
+            root.update_idletasks()
+
+        parse_time = _measure(lambda: htmltext.parse_html(html, cache=None), repetitions)
+        insert_time = _measure(insert_and_update, repetitions)
+        render_time = _measure(render_and_update, repetitions)
+        sync_time = _measure(set_and_update, repetitions)
+        print("%-20s %10.2f %10.2f %10.2f %10.2f" % (name, parse_time, insert_time, render_time, sync_time))
+
+    root.destroy()
+
+
+class _BenchmarkWorkbench:
+    """Provides the parts of Thonny's workbench, which ExercisesView needs"""
+
+    def __init__(self):
+        self._defaults = {}
+
+    def set_default(self, name, value):
+        self._defaults[name] = value
+
+    def get_option(self, name, default=None):
+        return self._defaults.get(name, default)
+
+
+def _measure_startup():
+    # Runs in a fresh interpreter. Thonny and tkinter are loaded before plug-ins.
+    import thonny
+    from thonny import codeview  # noqa: F401
+
+    start = time.perf_counter()
+    modules_before = set(sys.modules)
+    import thonnycontrib.easy
+    import_time = (time.perf_counter() - start) * 1000
+    added_modules = len(set(sys.modules) - modules_before)
+
+    root = tk.Tk()
+    thonny._workbench = _BenchmarkWorkbench()
+    _prepare_thonny_styles()
+
+    from thonnycontrib.easy.ui import ExercisesView, ExerciseProvider
+    from thonnycontrib.easy.demo_exercise_provider import DemoExerciseProvider
+
+    class BenchmarkProvider(ExerciseProvider):
+        """Gives the demo benchmark page without delay and without network access"""
+
+        def __init__(self, exercises_view):
+            self._demo_provider = DemoExerciseProvider(exercises_view)
+
+        def get_html_and_breadcrumbs(self, url, form_data):
+            return self._demo_provider._get_benchmark_page1(), [("/", "Home")]
+
+        def get_image_if_modified(self, url, etag=None, last_modified=None):
+            res_path = os.path.join(os.path.dirname(thonnycontrib.easy.__file__), "res", "broken.png")
+            with open(res_path, "rb") as fp:
+                return fp.read(), None, None
+
+    start = time.perf_counter()
+    view = ExercisesView(root, BenchmarkProvider)
+    view.pack(fill="both", expand=True)
+    while "Palun oota" in view._html_widget.get("1.0", "end") or view._html_widget.get("1.0", "end").strip() == "":
+        root.update()
+    root.update_idletasks()
+    first_paint_time = (time.perf_counter() - start) * 1000
+
+    view.destroy()
+    root.destroy()
+    print(import_time, added_modules, first_paint_time)
+
+
+def benchmark_startup(repetitions):
+    results = []
+    for _ in range(repetitions):
+        # empty user dir, so that caches are cold
+        with tempfile.TemporaryDirectory() as user_dir:
+            output = subprocess.check_output([sys.executable, __file__, "_measure_startup"],
+                                             env=dict(os.environ, THONNY_USER_DIR=user_dir),
+                                             universal_newlines=True)
+        import_time, added_modules, first_paint_time = output.split()
+        results.append((float(import_time), int(added_modules), float(first_paint_time)))
+
+    print("%-30s %10.2f" % ("plug-in import ms", statistics.median(r[0] for r in results)))
+    print("%-30s %10d" % ("modules added by import", statistics.median(r[1] for r in results)))
+    print("%-30s %10.2f" % ("time to first paint ms", statistics.median(r[2] for r in results)))
+
+
+def benchmark_comparison(baseline_revision, repetitions):
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        worktree_dir = os.path.join(temp_dir, "baseline")
+        subprocess.check_call(["git", "worktree", "add", "--detach", worktree_dir, baseline_revision], cwd=repo_dir)
+        try:
+            # baseline may predate this script
+            shutil.copy(os.path.abspath(__file__), worktree_dir)
+            print("Baseline (%s):" % baseline_revision)
+            subprocess.check_call([sys.executable, "benchmark.py", "rendering", str(repetitions)], cwd=worktree_dir)
+        finally:
+            subprocess.check_call(["git", "worktree", "remove", "--force", worktree_dir], cwd=repo_dir)
+
+    print()
+    print("Current tree:")
+    benchmark_rendering(repetitions)
+
+
+def _start_virtual_display():
+    """Returns Xvfb process, if it was needed and started"""
+    if not sys.platform.startswith("linux") or os.environ.get("DISPLAY"):
+        return None
+
+    if shutil.which("Xvfb") is None:
+        sys.exit("No display. Set DISPLAY or install Xvfb.")
+
+    display_number = 100 + os.getpid() % 100
+    proc = subprocess.Popen(["Xvfb", ":%d" % display_number, "-screen", "0", "1280x1024x24", "-nolisten", "tcp"],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        if os.path.exists("/tmp/.X11-unix/X%d" % display_number):
+            break
+        time.sleep(0.05)
+    # also for subprocesses
+    os.environ["DISPLAY"] = ":%d" % display_number
+    return proc
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "_measure_startup":
+        _measure_startup()
+        sys.exit()
+
+    xvfb = _start_virtual_display()
+    try:
+        if len(sys.argv) > 1 and sys.argv[1] == "startup":
+            benchmark_startup(int(sys.argv[2]) if len(sys.argv) > 2 else 10)
+        elif len(sys.argv) > 2 and sys.argv[1] == "compare":
+            benchmark_comparison(sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else 20)
+        elif len(sys.argv) > 1 and sys.argv[1] == "rendering":
+            benchmark_rendering(int(sys.argv[2]) if len(sys.argv) > 2 else 20)
+        else:
+            benchmark_rendering(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
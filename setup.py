@@ -14,7 +14,7 @@ setuptools.setup(
     url="https://github.com/kspar/easy-thonny",
     packages=setuptools.find_namespace_packages(),
     install_requires=[
-        'easy-py>=0.3.8',
+        'easy-py>=0.3.8,<0.4',
         'thonny>=3.2.7',
         'pillow>=8.0',
         'chevron>=0.13.1',
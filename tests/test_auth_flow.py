@@ -0,0 +1,56 @@
+import threading
+import time
+
+from thonnycontrib.easy import auth_flow
+from thonnycontrib.easy.auth_flow import AuthFlow, WAITING, SUCCEEDED
+
+TIMEOUT = 5
+
+
+class _FakeUtil:
+    auth_server_thread = None
+    auth_server_port = None
+
+
+class _FakeEz:
+    """Auth server runs until tokens get delivered"""
+
+    def __init__(self):
+        self.util = _FakeUtil()
+        self.delivered = threading.Event()
+        self.browser_openings = 0
+
+    def start_auth_in_browser(self):
+        self.util.auth_server_port = 12345
+        self.util.auth_server_thread = threading.Thread(target=self.delivered.wait, daemon=True)
+        self.util.auth_server_thread.start()
+        self.browser_openings += 1
+
+    def is_auth_required(self):
+        return not self.delivered.is_set()
+
+    def shutdown(self):
+        self.delivered.set()
+
+
+def _wait_for_state(flow, state):
+    deadline = time.time() + TIMEOUT
+    while flow.state != state:
+        assert time.time() < deadline, flow.state
+        time.sleep(0.01)
+
+
+def test_starting_waiting_flow_opens_login_page_again(monkeypatch):
+    opened_urls = []
+    monkeypatch.setattr(auth_flow.webbrowser, "open", opened_urls.append)
+    ez = _FakeEz()
+    flow = AuthFlow(ez, lambda state: None)
+    flow.start()
+    _wait_for_state(flow, WAITING)
+
+    flow.start()
+    assert opened_urls == ["http://127.0.0.1:12345/login"]
+    assert ez.browser_openings == 1
+
+    ez.delivered.set()
+    _wait_for_state(flow, SUCCEEDED)
@@ -0,0 +1,122 @@
+import threading
+from dataclasses import dataclass
+
+from thonnycontrib.easy import backend_cache
+from thonnycontrib.easy.backend_cache import ResponseCache
+
+TIMEOUT = 5
+
+
+class _FakeTime:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@dataclass
+class _Resp:
+    text: str
+
+
+class _Backend:
+    """Gives a new response for each fetch"""
+
+    def __init__(self):
+        self.fetch_count = 0
+
+    def fetch(self):
+        self.fetch_count += 1
+        return _Resp("response %d" % self.fetch_count)
+
+
+def _create_cache(monkeypatch, ttl, stale_period, on_change=None):
+    fake_time = _FakeTime()
+    monkeypatch.setattr(backend_cache, "time", fake_time)
+    cache = ResponseCache({"get_thing": (ttl, stale_period), "get_other": (ttl, stale_period)},
+                          on_change=on_change)
+    return cache, fake_time
+
+
+def test_response_is_given_from_cache_until_ttl_passes(monkeypatch):
+    cache, fake_time = _create_cache(monkeypatch, 60, 0)
+    backend = _Backend()
+
+    assert cache.get("get_thing", (1,), backend.fetch) == _Resp("response 1")
+    fake_time.now += 59
+    assert cache.get("get_thing", (1,), backend.fetch) == _Resp("response 1")
+    assert cache.get("get_thing", (2,), backend.fetch) == _Resp("response 2")
+
+    fake_time.now += 1
+    assert cache.get("get_thing", (1,), backend.fetch) == _Resp("response 3")
+    assert cache.get_stats()["hits"] == 1
+
+
+def test_stale_response_is_given_and_revalidated_in_background(monkeypatch):
+    changed = threading.Event()
+    cache, fake_time = _create_cache(monkeypatch, 60, 600, on_change=changed.set)
+    backend = _Backend()
+    cache.get("get_thing", (1,), backend.fetch)
+
+    fake_time.now += 120
+    assert cache.get("get_thing", (1,), backend.fetch) == _Resp("response 1")
+    assert changed.wait(TIMEOUT)
+    assert cache.get("get_thing", (1,), backend.fetch) == _Resp("response 2")
+    assert backend.fetch_count == 2
+
+
+def test_too_old_response_is_not_given_stale(monkeypatch):
+    cache, fake_time = _create_cache(monkeypatch, 60, 600)
+    backend = _Backend()
+    cache.get("get_thing", (1,), backend.fetch)
+
+    fake_time.now += 660
+    assert cache.get("get_thing", (1,), backend.fetch) == _Resp("response 2")
+
+
+def test_invalidation_removes_responses_with_given_argument_prefix(monkeypatch):
+    cache, _ = _create_cache(monkeypatch, 60, 0)
+    backend = _Backend()
+    for key in [("get_thing", (1, 1)), ("get_thing", (1, 2)), ("get_thing", (2, 1)), ("get_other", (1, 1))]:
+        cache.get(*key, backend.fetch)
+
+    cache.invalidate("get_thing", 1)
+    assert cache.get("get_thing", (1, 1), backend.fetch) == _Resp("response 5")
+    assert cache.get("get_thing", (1, 2), backend.fetch) == _Resp("response 6")
+    assert cache.get("get_thing", (2, 1), backend.fetch) == _Resp("response 3")
+    assert cache.get("get_other", (1, 1), backend.fetch) == _Resp("response 4")
+
+
+def test_response_fetched_during_invalidation_is_not_cached(monkeypatch):
+    cache, _ = _create_cache(monkeypatch, 60, 0)
+    fetch_started = threading.Event()
+    invalidated = threading.Event()
+    results = []
+
+    def slow_fetch():
+        fetch_started.set()
+        assert invalidated.wait(TIMEOUT)
+        return "response before submission"
+
+    thread = threading.Thread(target=lambda: results.append(cache.get("get_thing", (1,), slow_fetch)))
+    thread.start()
+    assert fetch_started.wait(TIMEOUT)
+    cache.invalidate("get_thing", 1)
+    invalidated.set()
+    thread.join(TIMEOUT)
+
+    # the caller gets what it asked for, but later callers don't
+    assert results == ["response before submission"]
+    assert cache.get("get_thing", (1,), lambda: "response after submission") == "response after submission"
+
+
+def test_suspended_cache_gives_stale_response_without_revalidation(monkeypatch):
+    cache, fake_time = _create_cache(monkeypatch, 60, 600)
+    backend = _Backend()
+    cache.get("get_thing", (1,), backend.fetch)
+    cache.suspend()
+
+    fake_time.now += 120
+    assert cache.get("get_thing", (1,), backend.fetch) == _Resp("response 1")
+    assert backend.fetch_count == 1
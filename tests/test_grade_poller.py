@@ -0,0 +1,100 @@
+import threading
+import time
+
+import pytest
+from easy import SubmissionResp, AutogradeStatus
+
+from thonnycontrib.easy import grade_poller
+from thonnycontrib.easy.grade_poller import GradePoller
+
+TIMEOUT = 5
+
+
+@pytest.fixture(autouse=True)
+def short_delays(monkeypatch):
+    monkeypatch.setattr(grade_poller, "FIRST_POLL_DELAY", 0.02)
+    monkeypatch.setattr(grade_poller, "MAX_POLL_DELAY", 0.16)
+
+
+class _Backend:
+    """Grading completes after given number of polls"""
+
+    def __init__(self, polls_until_graded):
+        self.polls_until_graded = polls_until_graded
+        self.poll_times = []
+
+    def get_latest_submission(self, course_id, exercise_id):
+        self.poll_times.append(time.perf_counter())
+        if len(self.poll_times) < self.polls_until_graded:
+            return SubmissionResp(autograde_status=AutogradeStatus.IN_PROGRESS.value)
+        return SubmissionResp(autograde_status=AutogradeStatus.COMPLETED.value)
+
+
+def _wait_until(condition):
+    deadline = time.time() + TIMEOUT
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+def test_polls_with_growing_delays_until_graded():
+    backend = _Backend(polls_until_graded=6)
+    graded = threading.Event()
+    poller = GradePoller(backend.get_latest_submission, lambda course_id, exercise_id: graded.set())
+    poller.start("1", "2")
+
+    assert graded.wait(TIMEOUT)
+    intervals = [later - earlier for earlier, later in zip(backend.poll_times, backend.poll_times[1:])]
+    # 0.04, 0.08, 0.16, 0.16, 0.16
+    assert intervals[1] > intervals[0] * 1.5
+    assert intervals[2] > intervals[0] * 3
+    assert intervals[-1] < 0.16 * 1.5 + 0.1
+
+
+def test_polling_is_given_up(monkeypatch):
+    monkeypatch.setattr(grade_poller, "MAX_POLLING_TIME", 0.1)
+    backend = _Backend(polls_until_graded=1000)
+    poller = GradePoller(backend.get_latest_submission, lambda course_id, exercise_id: pytest.fail("graded"))
+    poller.start("1", "2")
+
+    # 0.02 + 0.04 + 0.08
+    _wait_until(lambda: not poller._stop_events)
+    assert len(backend.poll_times) == 3
+
+
+def test_exercise_is_polled_by_one_thread():
+    backend = _Backend(polls_until_graded=1000)
+    poller = GradePoller(backend.get_latest_submission, lambda course_id, exercise_id: None)
+    threads_before = set(threading.enumerate())
+    for _ in range(3):
+        poller.start("1", "2")
+    new_threads = set(threading.enumerate()) - threads_before
+    poller.stop_all()
+
+    assert len(new_threads) == 1
+
+
+def test_stopped_poller_doesnt_poll():
+    backend = _Backend(polls_until_graded=1000)
+    poller = GradePoller(backend.get_latest_submission, lambda course_id, exercise_id: None)
+    poller.start("1", "2")
+    _wait_until(lambda: len(backend.poll_times) == 1)
+    poller.stop_all()
+
+    time.sleep(0.2)
+    assert len(backend.poll_times) == 1
+
+
+def test_suspended_polling_continues_after_resume():
+    backend = _Backend(polls_until_graded=3)
+    graded = threading.Event()
+    poller = GradePoller(backend.get_latest_submission, lambda course_id, exercise_id: graded.set())
+    poller.start("1", "2")
+    _wait_until(lambda: len(backend.poll_times) == 1)
+    poller.suspend()
+    poller.start("1", "3")
+
+    time.sleep(0.2)
+    assert len(backend.poll_times) == 1
+    poller.resume()
+    assert graded.wait(TIMEOUT)
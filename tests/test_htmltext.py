@@ -0,0 +1,23 @@
+import itertools
+
+from thonnycontrib.easy.htmltext import parse_html, TEXT, SECTION
+
+BLOCKS = ["<p>foo</p>", "<div>foo</div>", "text", "<h1>title</h1>", "<ul><li>a</li></ul>", "<ol><li>b</li></ol>",
+          "<pre>code\nmore</pre>", "<details><summary>s</summary>d</details>"]
+
+
+def _get_text(display_list):
+    return "".join(item[1] for item in display_list.items if item[0] == TEXT)
+
+
+def test_sectioned_parse_gives_same_text_as_whole_document_parse():
+    for blocks in itertools.product(BLOCKS, repeat=3):
+        whole = parse_html("".join(blocks), cache=None)
+        sectioned = parse_html("<!-- section: a -->".join(blocks), cache=None)
+        assert _get_text(sectioned) == _get_text(whole), blocks
+
+
+def test_section_signature_reflects_added_spacer():
+    display_list = parse_html("<div>foo</div><!-- section: a --><p>bar</p>", cache=None)
+    signatures = [item[2] for item in display_list.items if item[0] == SECTION]
+    assert signatures[1].endswith(":spaced")
@@ -0,0 +1,24 @@
+from io import BytesIO
+
+from PIL import Image
+
+from thonnycontrib.easy.ui import _decode_image, IMAGE_WIDTH
+
+
+def _get_data(img, format):
+    with BytesIO() as fp:
+        img.save(fp, format=format)
+        return fp.getvalue()
+
+
+def test_wide_palette_image_gets_decoded():
+    img = Image.new("RGB", (IMAGE_WIDTH * 8, 100), (200, 30, 30)).convert("P")
+    for format in ["PNG", "GIF"]:
+        decoded = _decode_image(_get_data(img, format))
+        assert decoded.size == (IMAGE_WIDTH, 12)
+
+
+def test_wide_image_of_unreducible_mode_gets_decoded():
+    for mode in ["1", "I;16"]:
+        decoded = _decode_image(_get_data(Image.new(mode, (IMAGE_WIDTH * 8, 100)), "PNG"))
+        assert decoded.size == (IMAGE_WIDTH, 12)
@@ -0,0 +1,49 @@
+from easy import BasicCourseInfoResp, SubmissionResp
+
+from thonnycontrib.easy.local_store import LocalStore, NOT_FOUND
+
+
+def _create_store(tmp_path, user="student-1"):
+    store = LocalStore(str(tmp_path / "store.sqlite3"))
+    store.set_user(user)
+    return store
+
+
+def test_response_survives_restart(tmp_path):
+    _create_store(tmp_path).put(("get_course_basic_info", "1"), BasicCourseInfoResp(title="Programmeerimine"))
+    _create_store(tmp_path).put(("get_latest_submission", "1", "2"), None)
+
+    store = _create_store(tmp_path)
+    assert store.get(("get_course_basic_info", "1")) == BasicCourseInfoResp(title="Programmeerimine")
+    assert store.get(("get_latest_submission", "1", "2")) is None
+    assert store.get(("get_course_basic_info", "2")) is NOT_FOUND
+
+
+def test_responses_are_given_only_to_their_user(tmp_path):
+    _create_store(tmp_path).put(("get_latest_submission", "1", "2"), SubmissionResp(id="3", solution="print(1)"))
+
+    assert _create_store(tmp_path, None).get(("get_latest_submission", "1", "2")) is NOT_FOUND
+    assert _create_store(tmp_path, "student-2").get(("get_latest_submission", "1", "2")) is NOT_FOUND
+    assert _create_store(tmp_path).get(("get_latest_submission", "1", "2")).solution == "print(1)"
+
+
+def test_delete_removes_responses_with_given_argument_prefix(tmp_path):
+    store = _create_store(tmp_path)
+    for args in [("1", "1"), ("1", "2"), ("2", "1")]:
+        store.put(("get_exercise_details",) + args, None)
+
+    store.delete("get_exercise_details", "1")
+    assert store.get(("get_exercise_details", "1", "1")) is NOT_FOUND
+    assert store.get(("get_exercise_details", "1", "2")) is NOT_FOUND
+    assert store.get(("get_exercise_details", "2", "1")) is None
+
+
+def test_clear_removes_responses_of_current_user(tmp_path):
+    other_store = _create_store(tmp_path, "student-2")
+    other_store.put(("get_courses",), None)
+    store = _create_store(tmp_path)
+    store.put(("get_courses",), None)
+
+    store.clear()
+    assert store.get(("get_courses",)) is NOT_FOUND
+    assert other_store.get(("get_courses",)) is None
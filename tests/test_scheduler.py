@@ -0,0 +1,110 @@
+import threading
+import time
+
+from thonnycontrib.easy.scheduler import TaskScheduler, NAVIGATION_LANE, IMAGE_LANE, PREFETCH_LANE
+
+TIMEOUT = 5
+
+
+def _block(scheduler, lane=NAVIGATION_LANE):
+    """Occupies a worker until the returned event is set"""
+    started = threading.Event()
+    release = threading.Event()
+
+    def func():
+        started.set()
+        release.wait(TIMEOUT)
+
+    future = scheduler.submit(lane, func)
+    assert started.wait(TIMEOUT)
+    return release, future
+
+
+def test_free_thread_takes_task_of_most_important_lane():
+    scheduler = TaskScheduler(1)
+    release, _ = _block(scheduler)
+    order = []
+    futures = [scheduler.submit(PREFETCH_LANE, order.append, "prefetch"),
+               scheduler.submit(IMAGE_LANE, order.append, "image"),
+               scheduler.submit(NAVIGATION_LANE, order.append, "navigation")]
+    release.set()
+    for future in futures:
+        future.result(TIMEOUT)
+
+    assert order == ["navigation", "image", "prefetch"]
+    scheduler.shutdown()
+
+
+def test_lane_limit_is_respected():
+    scheduler = TaskScheduler(4, {IMAGE_LANE: 2})
+    lock = threading.Lock()
+    running = [0]
+    max_running = [0]
+
+    def func():
+        with lock:
+            running[0] += 1
+            max_running[0] = max(max_running[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+
+    futures = [scheduler.submit(IMAGE_LANE, func) for _ in range(6)]
+    for future in futures:
+        future.result(TIMEOUT)
+
+    assert max_running[0] == 2
+    scheduler.shutdown()
+
+
+def test_limited_lane_leaves_threads_to_other_lanes():
+    scheduler = TaskScheduler(2, {PREFETCH_LANE: 1})
+    release, _ = _block(scheduler, PREFETCH_LANE)
+    queued_prefetch = scheduler.submit(PREFETCH_LANE, lambda: None)
+    assert scheduler.submit(NAVIGATION_LANE, lambda: "page").result(TIMEOUT) == "page"
+    assert not queued_prefetch.done()
+
+    release.set()
+    queued_prefetch.result(TIMEOUT)
+    scheduler.shutdown()
+
+
+def test_queued_task_with_same_replace_key_gets_cancelled():
+    scheduler = TaskScheduler(1)
+    release, _ = _block(scheduler)
+    first = scheduler.submit(NAVIGATION_LANE, lambda: "first", replace_key="page")
+    other = scheduler.submit(NAVIGATION_LANE, lambda: "other", replace_key="image")
+    second = scheduler.submit(NAVIGATION_LANE, lambda: "second", replace_key="page")
+    release.set()
+
+    assert first.cancelled()
+    assert second.result(TIMEOUT) == "second"
+    assert other.result(TIMEOUT) == "other"
+    assert scheduler.get_stats()[NAVIGATION_LANE]["replaced"] == 1
+    scheduler.shutdown()
+
+
+def test_burst_of_tasks_runs_in_parallel_after_threads_got_idle():
+    task_count = 5
+    scheduler = TaskScheduler(task_count)
+    # leaves an idle thread
+    scheduler.submit(IMAGE_LANE, lambda: None).result(TIMEOUT)
+    time.sleep(0.05)
+
+    # completes only if all tasks run at the same time
+    barrier = threading.Barrier(task_count, timeout=TIMEOUT)
+    futures = [scheduler.submit(IMAGE_LANE, barrier.wait) for _ in range(task_count)]
+    for future in futures:
+        future.result(TIMEOUT)
+    scheduler.shutdown()
+
+
+def test_shutdown_cancels_queued_tasks():
+    scheduler = TaskScheduler(1)
+    release, running = _block(scheduler)
+    queued = scheduler.submit(NAVIGATION_LANE, lambda: None)
+    scheduler.shutdown()
+    release.set()
+
+    assert queued.cancelled()
+    running.result(TIMEOUT)
@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pytest
+
+from thonnycontrib.easy.backend_cache import SingleFlight
+
+TIMEOUT = 5
+CALLER_COUNT = 5
+
+
+def _call_concurrently(single_flight, key, func):
+    """Returns results (or exceptions) of concurrent callers, which all get to share the first call"""
+    results = []
+    lock = threading.Lock()
+
+    def caller():
+        try:
+            result = single_flight.do(key, func)
+        except Exception as e:
+            result = e
+        with lock:
+            results.append(result)
+
+    threads = [threading.Thread(target=caller) for _ in range(CALLER_COUNT)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(TIMEOUT)
+    return results
+
+
+def _wait_for_callers(single_flight, release):
+    # the first caller is in the call, others have joined it
+    deadline = time.time() + TIMEOUT
+    while single_flight.saved_count < CALLER_COUNT - 1:
+        assert time.time() < deadline
+        time.sleep(0.01)
+    release.set()
+
+
+def test_concurrent_callers_share_result():
+    single_flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def func():
+        calls.append(1)
+        assert release.wait(TIMEOUT)
+        return "result"
+
+    threading.Thread(target=_wait_for_callers, args=(single_flight, release)).start()
+    results = _call_concurrently(single_flight, "key", func)
+
+    assert results == ["result"] * CALLER_COUNT
+    assert len(calls) == 1
+    assert single_flight.call_count == 1
+
+
+def test_concurrent_callers_share_exception():
+    single_flight = SingleFlight()
+    release = threading.Event()
+    error = OSError("offline")
+
+    def func():
+        assert release.wait(TIMEOUT)
+        raise error
+
+    threading.Thread(target=_wait_for_callers, args=(single_flight, release)).start()
+    results = _call_concurrently(single_flight, "key", func)
+
+    assert results == [error] * CALLER_COUNT
+    assert single_flight.call_count == 1
+
+
+def test_later_call_is_made_again():
+    def fail():
+        raise OSError("offline")
+
+    single_flight = SingleFlight()
+    with pytest.raises(OSError):
+        single_flight.do("key", fail)
+
+    assert single_flight.do("key", lambda: "result") == "result"
+    assert single_flight.do("other", lambda: "other result") == "other result"
+    assert single_flight.call_count == 3
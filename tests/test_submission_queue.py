@@ -0,0 +1,156 @@
+from types import SimpleNamespace
+
+import pytest
+from easy import AuthRequiredException, ErrorResponseException, SubmissionResp
+
+from thonnycontrib.easy import submission_queue
+from thonnycontrib.easy.submission_queue import SubmissionQueue, QUEUED, WAITING_FOR_AUTH, ACCEPTED, FAILED
+
+
+class _FakeTime:
+    def __init__(self):
+        self.now = 1000000.0
+
+    def time(self):
+        return self.now
+
+
+class _Backend:
+    """Fails the posts with given exceptions (None means success)"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.submissions = []
+        self.post_count = 0
+
+    def post_submission(self, course_id, exercise_id, solution):
+        self.post_count += 1
+        outcome = self.outcomes.pop(0) if self.outcomes else None
+        if outcome is not None and not isinstance(outcome, _LostResponse):
+            raise outcome
+
+        self.submissions.append(SubmissionResp(id=str(len(self.submissions) + 1), solution=solution))
+        if isinstance(outcome, _LostResponse):
+            raise outcome.error
+
+    def get_latest_submission(self, course_id, exercise_id):
+        return self.submissions[-1] if self.submissions else None
+
+
+class _LostResponse:
+    """Backend gets the submission, but the client gets the error"""
+
+    def __init__(self, error):
+        self.error = error
+
+
+@pytest.fixture
+def fake_time(monkeypatch):
+    fake_time = _FakeTime()
+    monkeypatch.setattr(submission_queue, "time", fake_time)
+    return fake_time
+
+
+def _create_queue(tmp_path, backend, changes=None):
+    if changes is None:
+        changes = []
+    queue = SubmissionQueue(str(tmp_path / "store.sqlite3"), backend.post_submission, backend.get_latest_submission,
+                            lambda: "student-1", lambda course_id, exercise_id, state: changes.append(state))
+    # sending is driven by the test
+    queue.wake_up = lambda: None
+    return queue
+
+
+def _get_solutions(queue):
+    return [row[0] for row in queue._get_connection().execute("SELECT solution FROM submissions ORDER BY created")]
+
+
+def test_repeated_solution_is_queued_once(tmp_path, fake_time):
+    queue = _create_queue(tmp_path, _Backend())
+    queue.add("1", "2", "print(1)")
+    queue.add("1", "2", "print(1)")
+    assert _get_solutions(queue) == ["print(1)"]
+
+    # older unsent solution is not needed
+    fake_time.now += 1
+    queue.add("1", "2", "print(2)")
+    queue.add("1", "3", "print(1)")
+    assert _get_solutions(queue) == ["print(2)", "print(1)"]
+    assert queue.get_state("1", "2")["state"] == QUEUED
+
+
+def test_transient_error_is_retried_with_growing_delays(tmp_path, fake_time):
+    backend = _Backend(OSError("offline"), ErrorResponseException(SimpleNamespace(status_code=503)))
+    changes = []
+    queue = _create_queue(tmp_path, backend, changes)
+    queue.add("1", "2", "print(1)")
+
+    first_delay = queue._send_due_submissions()
+    assert submission_queue.FIRST_RETRY_DELAY <= first_delay <= submission_queue.FIRST_RETRY_DELAY * 1.5
+    assert queue._send_due_submissions() == pytest.approx(first_delay)
+
+    fake_time.now += first_delay
+    second_delay = queue._send_due_submissions()
+    assert submission_queue.FIRST_RETRY_DELAY * 2 <= second_delay <= submission_queue.FIRST_RETRY_DELAY * 3
+
+    fake_time.now += second_delay
+    assert queue._send_due_submissions() is None
+    assert backend.post_count == 3
+    assert changes[-1] == ACCEPTED
+    assert queue.get_state("1", "2")["attempts"] == 3
+
+
+def test_submission_accepted_despite_timeout_is_not_sent_again(tmp_path, fake_time):
+    backend = _Backend(_LostResponse(OSError("timed out")))
+    queue = _create_queue(tmp_path, backend)
+    queue.add("1", "2", "print(1)")
+
+    fake_time.now += queue._send_due_submissions()
+    assert queue._send_due_submissions() is None
+    assert backend.post_count == 1
+    assert len(backend.submissions) == 1
+    assert queue.get_state("1", "2")["state"] == ACCEPTED
+
+
+def test_submission_lost_in_timeout_is_sent_again(tmp_path, fake_time):
+    backend = _Backend(OSError("timed out"))
+    queue = _create_queue(tmp_path, backend)
+    queue.add("1", "2", "print(1)")
+
+    fake_time.now += queue._send_due_submissions()
+    assert queue._send_due_submissions() is None
+    assert backend.post_count == 2
+    assert queue.get_state("1", "2")["state"] == ACCEPTED
+
+
+def test_rejected_submission_is_not_retried(tmp_path, fake_time):
+    backend = _Backend(ErrorResponseException(SimpleNamespace(status_code=400)))
+    queue = _create_queue(tmp_path, backend)
+    queue.add("1", "2", "print(1)")
+
+    assert queue._send_due_submissions() is None
+    assert backend.post_count == 1
+    assert queue.get_state("1", "2")["state"] == FAILED
+
+
+def test_submission_waits_for_login(tmp_path, fake_time):
+    backend = _Backend(AuthRequiredException())
+    queue = _create_queue(tmp_path, backend)
+    queue.add("1", "2", "print(1)")
+
+    assert queue._send_due_submissions() is None
+    assert queue.get_state("1", "2")["state"] == WAITING_FOR_AUTH
+
+    queue.resume_after_login()
+    assert queue._send_due_submissions() is None
+    assert backend.post_count == 2
+    assert queue.get_state("1", "2")["state"] == ACCEPTED
+
+
+def test_queue_survives_restart(tmp_path, fake_time):
+    _create_queue(tmp_path, _Backend()).add("1", "2", "print(1)")
+
+    backend = _Backend()
+    queue = _create_queue(tmp_path, backend)
+    assert queue._send_due_submissions() is None
+    assert [submission.solution for submission in backend.submissions] == ["print(1)"]
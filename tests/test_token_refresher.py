@@ -0,0 +1,100 @@
+import base64
+import json
+import threading
+import time
+
+from easy import TokenType
+from easy.ez import StorableToken
+
+from thonnycontrib.easy.token_refresher import TokenRefresher, REFRESH_MARGIN
+
+TIMEOUT = 5
+MIN_VALID_SEC = 20
+
+
+def _make_token(issued_at, expires_at):
+    payload = base64.urlsafe_b64encode(json.dumps({"iat": issued_at, "exp": expires_at}).encode()).decode()
+    return StorableToken(TokenType.ACCESS, "header." + payload.rstrip("=") + ".signature", expires_at)
+
+
+class _FakeRequestUtil:
+    """Refreshing gives a token with given lifetime"""
+
+    auth_token_min_valid_sec = MIN_VALID_SEC
+
+    def __init__(self, token, lifetime=300):
+        self.token = token
+        self.lifetime = lifetime
+        self.refresh_count = 0
+        self.refreshed = threading.Event()
+
+    def get_stored_token(self, token_type):
+        assert token_type == TokenType.ACCESS
+        return self.token
+
+    def access_token_is_valid(self, token):
+        return token is not None and time.time() <= token.expires_at - self.auth_token_min_valid_sec
+
+    def _refresh_using_refresh_token(self):
+        self.refresh_count += 1
+        now = round(time.time())
+        self.token = _make_token(now, now + self.lifetime)
+        self.refreshed.set()
+        return True
+
+
+def test_token_gets_refreshed_before_it_expires():
+    now = round(time.time())
+    refresher = TokenRefresher(_FakeRequestUtil(None))
+
+    # long-lived token gets renewed with a margin
+    token = _make_token(now, now + 3600)
+    assert refresher._get_refresh_time(token) == now + 3600 - MIN_VALID_SEC - REFRESH_MARGIN
+    # short-lived token when a quarter of its lifetime is left
+    token = _make_token(now, now + 120)
+    assert refresher._get_refresh_time(token) == now + 120 - MIN_VALID_SEC - 30
+
+
+def test_refresh_time_of_undecodable_token_is_based_on_expiry():
+    refresher = TokenRefresher(_FakeRequestUtil(None))
+    token = StorableToken(TokenType.ACCESS, "opaque", 10000)
+    assert refresher._get_refresh_time(token) == 10000 - MIN_VALID_SEC - REFRESH_MARGIN
+
+
+def test_due_token_gets_refreshed_in_background():
+    now = round(time.time())
+    util = _FakeRequestUtil(_make_token(now - 300, now + 30))
+    refresher = TokenRefresher(util)
+    refresher.start()
+    try:
+        assert util.refreshed.wait(TIMEOUT)
+        assert util.access_token_is_valid(util.token)
+        # new token is not due yet
+        time.sleep(0.2)
+        assert util.refresh_count == 1
+    finally:
+        refresher.stop()
+
+
+def test_on_demand_refresh_is_skipped_if_token_was_just_refreshed():
+    now = round(time.time())
+    util = _FakeRequestUtil(_make_token(now, now + 300))
+    TokenRefresher(util)
+
+    # RequestUtil calls this when it finds an invalid token, which may have been refreshed meanwhile
+    assert util._refresh_using_refresh_token()
+    assert util.refresh_count == 0
+
+    util.token = _make_token(now - 300, now)
+    assert util._refresh_using_refresh_token()
+    assert util.refresh_count == 1
+
+
+def test_refresher_stays_off_without_patchable_method():
+    class OtherRequestUtil:
+        pass
+
+    refresher = TokenRefresher(OtherRequestUtil())
+    threads_before = set(threading.enumerate())
+    refresher.start()
+    assert set(threading.enumerate()) == threads_before
@@ -0,0 +1,50 @@
+import base64
+import json
+import os
+import time
+
+from easy import TokenType
+
+from thonnycontrib.easy.token_store import TokenStore
+
+
+def _make_token(token_type, claims, expires_in):
+    payload = base64.urlsafe_b64encode(json.dumps(claims).encode()).decode().rstrip("=")
+    return {"token_type": token_type.value, "token": "header." + payload + ".signature",
+            "expires_at": round(time.time() + expires_in)}
+
+
+def _log_in(store, refresh_expires_in=3600):
+    store.persist(TokenType.ACCESS, _make_token(TokenType.ACCESS, {"sub": "student-1"}, 300))
+    store.persist(TokenType.REFRESH, _make_token(TokenType.REFRESH, {}, refresh_expires_in))
+
+
+def test_login_survives_restart(tmp_path):
+    _log_in(TokenStore(str(tmp_path)))
+
+    store = TokenStore(str(tmp_path))
+    assert store.get_user() == "student-1"
+    assert store.retrieve(TokenType.ACCESS)["expires_at"] > time.time()
+
+
+def test_token_files_are_private(tmp_path):
+    _log_in(TokenStore(str(tmp_path)))
+    if os.name == "posix":
+        assert os.stat(tmp_path / "refresh_token.json").st_mode & 0o077 == 0
+
+
+def test_no_user_when_refresh_token_has_expired(tmp_path):
+    store = TokenStore(str(tmp_path))
+    assert store.get_user() is None
+    _log_in(store, refresh_expires_in=-1)
+    assert store.get_user() is None
+
+
+def test_clear_removes_tokens(tmp_path):
+    store = TokenStore(str(tmp_path))
+    _log_in(store)
+    store.clear()
+
+    assert store.retrieve(TokenType.ACCESS) is None
+    assert TokenStore(str(tmp_path)).get_user() is None
+    assert os.listdir(str(tmp_path)) == []
@@ -0,0 +1,40 @@
+import json
+import time
+
+from thonnycontrib.easy import update_check
+from thonnycontrib.easy.update_check import UpdateChecker
+
+
+def _write_state(path, **state):
+    state.setdefault("next_check", time.time() + 3600)
+    path.write_text(json.dumps(state), encoding="UTF-8")
+
+
+def test_update_is_required_for_older_major_version(tmp_path, monkeypatch):
+    monkeypatch.setattr(update_check, "_get_installed_version", lambda: "1.2.0")
+    _write_state(tmp_path / "state.json", latest="2.0.0")
+
+    checker = UpdateChecker(str(tmp_path / "state.json"))
+    assert checker.is_update_required()
+    assert checker.get_versions() == {"current": "1.2.0", "latest": "2.0.0"}
+
+
+def test_verdict_stored_before_update_is_not_trusted(tmp_path, monkeypatch):
+    # stored by a version before the student updated
+    monkeypatch.setattr(update_check, "_get_installed_version", lambda: "2.0.1")
+    _write_state(tmp_path / "state.json", update_required=True, current="1.2.0", latest="2.0.0")
+
+    assert not UpdateChecker(str(tmp_path / "state.json")).is_update_required()
+
+
+def test_no_update_required_without_versions(tmp_path, monkeypatch):
+    def fail():
+        raise RuntimeError("not installed")
+
+    monkeypatch.setattr(update_check, "_get_installed_version", fail)
+    _write_state(tmp_path / "state.json", latest="2.0.0")
+    assert not UpdateChecker(str(tmp_path / "state.json")).is_update_required()
+
+    monkeypatch.setattr(update_check, "_get_installed_version", lambda: "1.0.0")
+    _write_state(tmp_path / "other.json")
+    assert not UpdateChecker(str(tmp_path / "other.json")).is_update_required()
@@ -1,18 +1,23 @@
 from thonny import get_workbench, THONNY_USER_DIR
 
-from thonnycontrib.easy.ui import ExercisesView
 
+def _lazy_view(class_name):
+    """Returns constructor for a view class of thonnycontrib.easy.views.
 
-class EasyExercisesView(ExercisesView):
-    def __init__(self, master):
-        from thonnycontrib.easy.easy_provider import EasyExerciseProvider
-        super(EasyExercisesView, self).__init__(master, EasyExerciseProvider)
+    The views (and their dependencies) get imported only when the view is first shown.
+    """
 
+    def create_view(master):
+        from thonnycontrib.easy import views
+        return getattr(views, class_name)(master)
 
-class DemoExercisesView(ExercisesView):
-    def __init__(self, master):
-        from thonnycontrib.easy.demo_exercise_provider import DemoExerciseProvider
-        super(DemoExercisesView, self).__init__(master, DemoExerciseProvider)
+    # Thonny uses it as view id
+    create_view.__name__ = class_name
+    return create_view
+
+
+EasyExercisesView = _lazy_view("EasyExercisesView")
+DemoExercisesView = _lazy_view("DemoExercisesView")
 
 
 def load_plugin():
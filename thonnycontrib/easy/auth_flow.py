@@ -0,0 +1,112 @@
+import logging
+import threading
+import webbrowser
+from typing import Callable
+
+from easy.ez import AUTH_SERVER_HOST
+
+logger = logging.getLogger(__name__)
+
+IDLE = "idle"
+STARTING = "starting"
+WAITING = "waiting"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class AuthFlow:
+    """Runs browser authentication of an Ez client in the background.
+
+    State goes from IDLE (or a final state) to STARTING (local auth server is being started and
+    browser opened), WAITING (for the browser to deliver the tokens) and finally SUCCEEDED or FAILED.
+    on_state_change gets called in the background thread after each transition.
+    """
+
+    def __init__(self, ez, on_state_change: Callable[[str], None]):
+        self._ez = ez
+        self._on_state_change = on_state_change
+        self._lock = threading.Lock()
+        self._state = IDLE
+        self._cancelled = False
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def is_active(self) -> bool:
+        return self._state in (STARTING, WAITING)
+
+    def start(self):
+        """Starts the flow. If it is waiting already, opens the login page again
+        (eg. the student has closed the browser tab)."""
+        with self._lock:
+            if self._state == STARTING:
+                return
+            reopen = self._state == WAITING
+            if not reopen:
+                self._state = STARTING
+                self._cancelled = False
+
+        if reopen:
+            self._reopen_login_page()
+            return
+
+        threading.Thread(target=self._run, daemon=True, name="LahendusAuthFlow").start()
+
+    def _reopen_login_page(self):
+        server_thread = self._ez.util.auth_server_thread
+        port = self._ez.util.auth_server_port
+        if server_thread is None or not server_thread.is_alive() or port is None:
+            # Tokens have just arrived or the server has stopped. The flow ends and reports the outcome.
+            logger.info("Auth server is not running anymore, not opening login page")
+            return
+
+        logger.info("Opening login page again")
+        # Server keeps running, so the page can be opened directly
+        webbrowser.open(f"http://{AUTH_SERVER_HOST}:{port}/login")
+
+    def cancel(self):
+        """Stops the local auth server, the flow ends as IDLE"""
+        if self.is_active():
+            logger.info("Cancelling authentication")
+            self._cancelled = True
+            self._ez.shutdown()
+
+    def _run(self):
+        self._notify()
+        try:
+            self._ez.start_auth_in_browser()
+            # Server clears this when it receives the tokens, so it must be taken right away
+            server_thread = self._ez.util.auth_server_thread
+            if self._cancelled:
+                # cancelled while the server was starting
+                self._ez.shutdown()
+            self._set_state(WAITING)
+
+            if server_thread is not None:
+                # Ends when the browser has delivered the tokens or the server was shut down
+                server_thread.join()
+            succeeded = not self._ez.is_auth_required()
+        except Exception:
+            logger.exception("Authentication failed")
+            succeeded = False
+
+        if succeeded:
+            logger.info("Authentication succeeded")
+            self._set_state(SUCCEEDED)
+        elif self._cancelled:
+            self._set_state(IDLE)
+        else:
+            logger.info("Authentication failed")
+            self._set_state(FAILED)
+
+    def _set_state(self, state):
+        with self._lock:
+            self._state = state
+        self._notify()
+
+    def _notify(self):
+        try:
+            self._on_state_change(self._state)
+        except Exception:
+            logger.exception("Error in authentication state handler")
@@ -0,0 +1,316 @@
+import functools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, Tuple, Callable, Any, Optional
+
+from easy import SubmissionResp, EmptyResp, StudentAllSubmissionsResp, ErrorResponseException
+
+from .local_store import LocalStore, NOT_FOUND, serialize_response
+
+logger = logging.getLogger(__name__)
+
+# endpoint -> (TTL, stale period) in seconds.
+# During the stale period the cached response is returned, but it gets refreshed in the background.
+# Submission data is not served stale, as student wants to see the current grade.
+DEFAULT_POLICIES = {
+    "get_courses": (300, 3600),
+    "get_course_exercises": (120, 3600),
+    "get_exercise_details": (300, 3600),
+    "get_course_basic_info": (3600, 24 * 3600),
+    "get_latest_submission": (60, 0),
+    "get_submissions_page": (60, 0),
+}
+SUBMISSION_ENDPOINTS = ["get_latest_submission", "get_submissions_page"]
+# Responses of these endpoints are kept also in the local store, so that pages can be shown
+# right after Thonny starts and when the backend can't be reached.
+PERSISTED_ENDPOINTS = ["get_courses", "get_course_exercises", "get_exercise_details",
+                       "get_course_basic_info", "get_latest_submission"]
+MAX_ENTRIES = 500
+STATS_LOGGING_INTERVAL = 50
+
+
+class SingleFlight:
+    """Lets concurrent callers with the same key share one call and its result or exception"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._futures = {}  # key -> Future of the call in flight
+        self.call_count = 0
+        self.saved_count = 0
+
+    def do(self, key, func: Callable[[], Any]) -> Any:
+        with self._lock:
+            future = self._futures.get(key)
+            if future is not None:
+                self.saved_count += 1
+                return_shared = True
+            else:
+                future = Future()
+                self._futures[key] = future
+                self.call_count += 1
+                return_shared = False
+
+        if return_shared:
+            return future.result()
+
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._futures[key]
+
+
+class ResponseCache:
+    """Keeps backend responses for a while, according to the policy of the endpoint.
+
+    If a local store is given, responses of persisted endpoints missing from memory are taken from there
+    (and revalidated in the background). on_change gets called (in a background thread)
+    when a revalidation brings a different response.
+
+    Can be used from several threads.
+    """
+
+    def __init__(self, policies: Dict[str, Tuple[float, float]] = None, max_entries=MAX_ENTRIES,
+                 store: Optional[LocalStore] = None, on_change: Optional[Callable[[], None]] = None):
+        self._policies = DEFAULT_POLICIES if policies is None else policies
+        self._max_entries = max_entries
+        self._store = store
+        self._on_change = on_change
+        self._entries = OrderedDict()  # key -> (response, time of fetching)
+        self._revalidating_keys = set()
+        # While suspended, stale responses are given without revalidation
+        self._suspended = False
+        # Incremented by invalidations. Responses fetched before an invalidation don't get stored.
+        self._generation = 0
+        self._lock = threading.Lock()
+        # cache misses and revalidations of the same key share the request
+        self._single_flight = SingleFlight()
+        self._hits = 0
+        self._stale_hits = 0
+        self._misses = 0
+        self._store_hits = 0
+
+    def get(self, endpoint: str, args: Tuple, fetch: Callable[[], Any]) -> Any:
+        key = (endpoint,) + tuple(args)
+        ttl, stale_period = self._policies[endpoint]
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                response, fetch_time = entry
+                age = time.monotonic() - fetch_time
+            if entry is None or age >= ttl + stale_period:
+                self._misses += 1
+                outcome = None
+            elif age < ttl:
+                self._hits += 1
+                outcome = "hit"
+            else:
+                self._stale_hits += 1
+                outcome = "stale"
+            self._log_stats_if_needed()
+
+        if outcome == "hit":
+            return response
+        elif outcome == "stale":
+            self._revalidate_in_background(key, fetch, response)
+            return response
+
+        if entry is None and self._is_persisted(endpoint):
+            stored_response = self._store.get(key)
+            if stored_response is not NOT_FOUND:
+                with self._lock:
+                    self._store_hits += 1
+                    # next request (after the revalidation) shouldn't come to the store again
+                    self._entries[key] = (stored_response, time.monotonic() - ttl)
+                self._revalidate_in_background(key, fetch, stored_response)
+                return stored_response
+
+        try:
+            return self._single_flight.do(key, lambda: self._fetch_and_store(key, fetch))
+        except OSError as e:
+            # eg. offline
+            if not self._is_persisted(endpoint):
+                raise
+            stored_response = self._store.get(key)
+            if stored_response is NOT_FOUND:
+                raise
+            logger.info(f"Could not fetch {key} ('{e}'), using stored response")
+            return stored_response
+
+    def invalidate(self, endpoint: str, *args):
+        """Removes entries of the endpoint, whose arguments start with given args"""
+        prefix = (endpoint,) + args
+        with self._lock:
+            self._generation += 1
+            for key in [key for key in self._entries if key[:len(prefix)] == prefix]:
+                del self._entries[key]
+
+        if self._is_persisted(endpoint):
+            self._store.delete(endpoint, *args)
+
+    def suspend(self):
+        self._suspended = True
+
+    def resume(self):
+        self._suspended = False
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def get_stats(self):
+        with self._lock:
+            return {"hits": self._hits, "stale_hits": self._stale_hits, "misses": self._misses,
+                    "store_hits": self._store_hits,
+                    "size": len(self._entries),
+                    "requests": self._single_flight.call_count,
+                    "saved_requests": self._single_flight.saved_count}
+
+    def _fetch_and_store(self, key, fetch):
+        with self._lock:
+            generation = self._generation
+
+        response = fetch()
+
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = (response, time.monotonic())
+                self._entries.move_to_end(key)
+                while len(self._entries) > self._max_entries:
+                    self._entries.popitem(last=False)
+                stored = True
+            else:
+                stored = False
+
+        if stored and self._is_persisted(key[0]):
+            self._store.put(key, response)
+
+        return response
+
+    def _is_persisted(self, endpoint):
+        return self._store is not None and endpoint in PERSISTED_ENDPOINTS
+
+    def _revalidate_in_background(self, key, fetch, old_response):
+        with self._lock:
+            if key in self._revalidating_keys or self._suspended:
+                return
+            self._revalidating_keys.add(key)
+
+        def revalidate():
+            try:
+                response = self._single_flight.do(key, lambda: self._fetch_and_store(key, fetch))
+            except Exception as e:
+                # stale response will be used until next attempt
+                logger.info(f"Could not revalidate cached response of {key}: '{e}'")
+                return
+            finally:
+                with self._lock:
+                    self._revalidating_keys.discard(key)
+
+            if self._on_change is not None and serialize_response(response) != serialize_response(old_response):
+                logger.info(f"Revalidation of {key} brought a different response")
+                self._on_change()
+
+        threading.Thread(target=revalidate, daemon=True).start()
+
+    def _log_stats_if_needed(self):
+        # Must be called with the lock held
+        total = self._hits + self._stale_hits + self._misses
+        if total % STATS_LOGGING_INTERVAL == 0:
+            logger.info(f"Response cache: {self._hits} hits, {self._stale_hits} stale hits, {self._misses} misses, "
+                        f"{self._store_hits} local store hits, "
+                        f"hit rate {(self._hits + self._stale_hits) / total:.0%}, {len(self._entries)} entries. "
+                        f"{self._single_flight.saved_count} requests saved by sharing in-flight requests.")
+
+
+class CachingEz:
+    """Wraps Ez client, caching responses of student and common API"""
+
+    def __init__(self, ez, cache: ResponseCache = None):
+        self._ez = ez
+        self.cache = ResponseCache() if cache is None else cache
+        self.student = _CachingStudent(ez.student, self.cache)
+        self.common = _CachingCommon(ez.common, self.cache)
+
+    def __getattr__(self, name):
+        return getattr(self._ez, name)
+
+
+class _CachingStudent:
+    def __init__(self, student, cache: ResponseCache):
+        self._student = student
+        self._cache = cache
+
+    def get_courses(self):
+        return self._cache.get("get_courses", (), self._student.get_courses)
+
+    def get_course_exercises(self, course_id: str):
+        return self._cache.get("get_course_exercises", (course_id,),
+                               functools.partial(self._student.get_course_exercises, course_id))
+
+    def get_exercise_details(self, course_id: str, course_exercise_id: str):
+        return self._cache.get("get_exercise_details", (course_id, course_exercise_id),
+                               functools.partial(self._student.get_exercise_details, course_id, course_exercise_id))
+
+    def get_latest_submission(self, course_id: str, course_exercise_id: str) -> Optional[SubmissionResp]:
+        """Like get_latest_exercise_submission_details, but returns None if there are no submissions"""
+
+        def fetch():
+            path = f"/student/courses/{course_id}/exercises/{course_exercise_id}/submissions/latest/await"
+            try:
+                resp = self._student.request_util.get_request(path, {200: SubmissionResp, 204: EmptyResp})
+            except ErrorResponseException as e:
+                if e.resp.status_code == 404:
+                    return None
+                raise
+
+            if isinstance(resp, SubmissionResp) and resp.id is not None:
+                return resp
+            else:
+                return None
+
+        return self._cache.get("get_latest_submission", (course_id, course_exercise_id), fetch)
+
+    def get_submissions_page(self, course_id: str, course_exercise_id: str,
+                             offset: int, limit: int) -> StudentAllSubmissionsResp:
+        """Returns submissions (latest first) starting from offset. Count of the response is the total count."""
+        path = f"/student/courses/{course_id}/exercises/{course_exercise_id}/submissions/all?limit={limit}&offset={offset}"
+        return self._cache.get("get_submissions_page", (course_id, course_exercise_id, offset, limit),
+                               functools.partial(self._student.request_util.simple_get_request,
+                                                 path, StudentAllSubmissionsResp))
+
+    def post_submission(self, course_id: str, course_exercise_id: str, solution: str):
+        try:
+            return self._student.post_submission(course_id, course_exercise_id, solution)
+        finally:
+            # also when the outcome is unknown
+            for endpoint in SUBMISSION_ENDPOINTS:
+                self._cache.invalidate(endpoint, course_id, course_exercise_id)
+
+    def __getattr__(self, name):
+        return getattr(self._student, name)
+
+
+class _CachingCommon:
+    def __init__(self, common, cache: ResponseCache):
+        self._common = common
+        self._cache = cache
+
+    def get_course_basic_info(self, course_id: str):
+        return self._cache.get("get_course_basic_info", (course_id,),
+                               functools.partial(self._common.get_course_basic_info, course_id))
+
+    def __getattr__(self, name):
+        return getattr(self._common, name)
@@ -182,11 +182,6 @@ post
             source=source
         )
 
-    def get_image(self, url):
-        from urllib.request import urlopen
-        with urlopen(url) as fp:
-            return fp.read()
-
     def get_menu_items(self) -> List[Tuple[str, Union[str, Callable, None]]]:
         return [
             ("Logout", "/logout"),
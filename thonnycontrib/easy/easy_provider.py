@@ -1,78 +1,113 @@
+import concurrent.futures
 import logging
+import os.path
 import re
+import sqlite3
+import threading
 import time
-from typing import Tuple, List, Union, Callable
-
-import pkg_resources
-import requests
-from easy import Ez, AuthRequiredException, decode_token, ErrorResponseException
-
+from typing import Tuple, List, Union, Callable, Dict, Any
+
+from easy import Ez, AuthRequiredException, decode_token, ErrorResponseException, SubmissionResp
+from thonny import THONNY_USER_DIR
+
+from . import auth_flow
+from .auth_flow import AuthFlow
+from .backend_cache import CachingEz, ResponseCache, SUBMISSION_ENDPOINTS
+from .grade_poller import GradePoller
+from .htmltext import parse_html
+from .local_store import LocalStore
+from .submission_queue import SubmissionQueue, SENDING, ACCEPTED, FAILED
+from .token_refresher import TokenRefresher
+from .token_store import TokenStore
 from .templates_generator import *
+from .update_check import UpdateChecker
 from .ui import ExerciseProvider, FormData, EDITOR_CONTENT_NAME
 
-AUTH_TIMEOUT_SECONDS = 300
 ROOT_PATH = "/"
 HOME = [(ROOT_PATH, "Lahendus")]
 LOGOUT_PATH = "/logout"
 AUTH_PATH = "/auth"
+AUTH_PATH_CANCEL = "/auth/cancel"
 
 EXERCISE_LIST_RE = re.compile(r"^/student/courses/([0-9]+)/exercises/$")
 EXERCISE_DESCRIPTION_RE = re.compile(r"^/student/courses/([0-9]+)/exercises/([0-9]+)$")
 COURSE_LIST_RE = re.compile(r"^/student/courses$")
 SUBMIT_SOLUTION_RE = re.compile(r"^/student/courses/([0-9]+)/exercises/([0-9]+)/submissions$")
+SUBMISSION_LIST_RE = re.compile(r"^/student/courses/([0-9]+)/exercises/([0-9]+)/submissions/all$")
 
 PRODUCTION = True
+SUBMISSIONS_PAGE_SIZE = 10
+# Max number of backend calls made concurrently for building one page
+MAX_BACKEND_THREADS = 4
 
 logger = logging.getLogger(__name__)
 
 
-def _get_easy():
+def _get_easy(token_store: TokenStore):
     auth_browser_success_msg = "Autentimine õnnestus! Võid nüüd selle lehe sulgeda."
     auth_browser_fail_msg = "Midagi läks ootamatult valesti. Palun proovi uuesti."
 
     if PRODUCTION:
-        return Ez("ems.lahendus.ut.ee",
-                  'idp.lahendus.ut.ee',
-                  "lahendus.ut.ee",
-                  auth_browser_success_msg=auth_browser_success_msg,
-                  auth_browser_fail_msg=auth_browser_fail_msg)
+        ez = Ez("ems.lahendus.ut.ee",
+                'idp.lahendus.ut.ee',
+                "lahendus.ut.ee",
+                retrieve_token=token_store.retrieve,
+                persist_token=token_store.persist,
+                auth_browser_success_msg=auth_browser_success_msg,
+                auth_browser_fail_msg=auth_browser_fail_msg)
     else:
-        return Ez("dev.ems.lahendus.ut.ee",
-                  'dev.idp.lahendus.ut.ee',
-                  "dev.lahendus.ut.ee",
-                  auth_browser_success_msg=auth_browser_success_msg,
-                  auth_browser_fail_msg=auth_browser_fail_msg)
+        ez = Ez("dev.ems.lahendus.ut.ee",
+                'dev.idp.lahendus.ut.ee',
+                "dev.lahendus.ut.ee",
+                retrieve_token=token_store.retrieve,
+                persist_token=token_store.persist,
+                auth_browser_success_msg=auth_browser_success_msg,
+                auth_browser_fail_msg=auth_browser_fail_msg)
+
+    return ez
 
 
 # noinspection DuplicatedCode
 class EasyExerciseProvider(ExerciseProvider):
     def __init__(self, exercises_view):
         self.exercises_view = exercises_view
-        self.easy = _get_easy()
-        self.last_update_check = None
+        self._auth_from_url = ROOT_PATH
+        self._auth_waiting_page_shown = False
+        self._token_store = TokenStore(os.path.join(THONNY_USER_DIR, "lahendus"))
+        self._store = LocalStore(os.path.join(THONNY_USER_DIR, "lahendus", "store.sqlite3"))
+        # Login of previous session, stored pages can be shown before the backend answers
+        self._store.set_user(self._token_store.get_user())
+        self.easy = self._create_easy()
+        self._update_checker = UpdateChecker(os.path.join(THONNY_USER_DIR, "lahendus", "update_check.json"))
+        self._backend_executor = concurrent.futures.ThreadPoolExecutor(max_workers=MAX_BACKEND_THREADS)
+        self._grade_poller = GradePoller(self._fetch_latest_submission, self._on_graded)
+        self._submission_queue = SubmissionQueue(os.path.join(THONNY_USER_DIR, "lahendus", "store.sqlite3"),
+                                                 self._post_submission, self._fetch_latest_submission,
+                                                 lambda: self._store.user, self._on_submission_state_change)
+        # submissions left from previous session
+        self._submission_queue.wake_up()
+        # (course_id, exercise_id) -> state of a submission sent without the queue
+        self._direct_submission_states = {}
 
     def get_html_and_breadcrumbs(self, url: str, form_data: FormData) -> Tuple[str, List[Tuple[str, str]]]:
         logger.info(f"User query: '{url}'. Form data: '{form_data}'.")
+        self._auth_waiting_page_shown = False
         try:
-            if self._update_required():
-                logger.info(f"Plug-in update required from user: {self._get_versions()}")
-                return generate_update_html(self._get_versions()), HOME
+            # the check itself happens in the background
+            if self._update_checker.is_update_required():
+                logger.info(f"Plug-in update required from user: {self._update_checker.get_versions()}")
+                return generate_update_html(self._update_checker.get_versions()), HOME
+
+            if url == AUTH_PATH_CANCEL:
+                self._auth_flow.cancel()
+                return generate_login_html(self._auth_from_url), HOME
 
             if url == AUTH_PATH:
                 if self.easy.is_auth_required():
-                    self._authenticate()
-
-                    if self.easy.is_auth_required():
-                        logger.info('Authentication failed!')
-                        return generate_error_auth(), HOME
-                    else:
-                        info = decode_token(self.easy.util.get_valid_access_token().token)
-                        username, email = info['preferred_username'], info['email']
-                        given_name, family_name = info['given_name'], info['family_name']
-
-                        logger.info("Authenticated!")
-                        logger.info(f"Check-in. User: '{username}'. Name: {given_name} {family_name}. Email: {email}.")
-                        self.easy.check_in()
+                    # Completes in the background, see _on_auth_state_change
+                    self._auth_from_url = ROOT_PATH if form_data.get("from") is None else form_data.get("from")
+                    self._auth_flow.start()
+                    return self._show_auth_waiting_page()
 
                 url = ROOT_PATH if form_data.get("from") is None else form_data.get("from")
 
@@ -92,6 +127,10 @@ class EasyExerciseProvider(ExerciseProvider):
                 self.log_match("SUBMIT_SOLUTION", url, form_data)
                 return self._handle_submit_solution(form_data, SUBMIT_SOLUTION_RE.fullmatch(url))
 
+            elif SUBMISSION_LIST_RE.fullmatch(url):
+                self.log_match("SUBMISSION_LIST", url, form_data)
+                return self._show_submission_list(form_data, SUBMISSION_LIST_RE.fullmatch(url))
+
             elif url == LOGOUT_PATH:
                 self.log_match("LOGOUT_PATH", url, form_data)
                 self._logout()
@@ -102,16 +141,16 @@ class EasyExerciseProvider(ExerciseProvider):
 
         except AuthRequiredException:
             self.log_match("AuthRequiredException", url, form_data)
+            # Login has expired or was revoked, stored responses are not given out until next login
+            self._store.set_user(None)
 
-            # Allow only one instance of the auth server in all cases.
-            if self.easy.is_auth_in_progress(0):
-                logger.info("Auth server is already running. Closing auth server down.")
-                self.easy.shutdown()
-                logger.info("Returning auth error page.")
-                return generate_error_auth(), HOME
+            if self._auth_flow.is_active():
+                # Login continues to the latest page asked for
+                self._auth_from_url = url
+                return self._show_auth_waiting_page()
 
             logger.info("Auth required, returning auth page.")
-            return generate_login_html(url), HOME
+            return generate_login_html(url, self._auth_flow.state == auth_flow.FAILED), HOME
 
         except Exception as e:
             self.log_match("Exception", url, form_data)
@@ -125,16 +164,65 @@ class EasyExerciseProvider(ExerciseProvider):
 
     def _logout(self):
         self.easy.logout_in_browser()
+        self._auth_flow.cancel()
         self.easy.shutdown()
-        self.easy = _get_easy()
-
-    def _authenticate(self):
-        self.easy.start_auth_in_browser()
-        self.easy.is_auth_in_progress(AUTH_TIMEOUT_SECONDS)
+        self._token_refresher.stop()
+        self._grade_poller.stop_all()
+        self._store.clear()
+        self._store.set_user(None)
+        self._token_store.clear()
+        self.easy = self._create_easy()
+
+    def _create_easy(self):
+        # Responses are cached in memory per Ez instance, ie. forgotten on logout
+        cache = ResponseCache(store=self._store, on_change=self.exercises_view.notify_content_changed)
+        ez = _get_easy(self._token_store)
+        # Keeps the access token valid, so that page loads don't need to wait for refreshing
+        self._token_refresher = TokenRefresher(ez.util)
+        self._token_refresher.start()
+        self._auth_flow = AuthFlow(ez, self._on_auth_state_change)
+        return CachingEz(ez, cache)
+
+    def _show_auth_waiting_page(self):
+        self._auth_waiting_page_shown = True
+        return generate_auth_waiting_html(self._auth_flow.state == auth_flow.STARTING), HOME
+
+    def _on_auth_state_change(self, state: str):
+        # Runs in auth flow's thread
+        if state == auth_flow.SUCCEEDED:
+            logger.info("Authenticated!")
+            self._store.set_user(self._token_store.get_user())
+            try:
+                info = decode_token(self.easy.util.get_valid_access_token().token)
+                username, email = info['preferred_username'], info['email']
+                given_name, family_name = info['given_name'], info['family_name']
+                logger.info(f"Check-in. User: '{username}'. Name: {given_name} {family_name}. Email: {email}.")
+            except Exception as e:
+                logger.warning(f"Could not read user info from access token: '{e}'")
+
+            try:
+                self.easy.check_in()
+            except Exception as e:
+                # eg. network error. The next page load shows the problem, if it persists.
+                logger.warning(f"Check-in failed: '{e}'")
+
+            self._token_refresher.wake_up()
+            self._submission_queue.resume_after_login()
+
+        if not self._auth_waiting_page_shown:
+            # The student has gone elsewhere meanwhile
+            return
+
+        if state == auth_flow.SUCCEEDED:
+            self.exercises_view.notify_navigation(self._auth_from_url)
+        else:
+            # shows the new state or the login page again
+            self.exercises_view.notify_content_changed()
 
     def _handle_submit_solution(self, form_data, match):
+        # The solution was taken by accept_form, the page shows the state of the submission
         course_id, ex_id = match.group(1), match.group(2)
-        return self._submit_solution(course_id, ex_id, form_data)
+        return self._get_ex_description(course_id, ex_id)
 
     def _show_course_list(self):
         courses = self.easy.student.get_courses().courses
@@ -144,6 +232,12 @@ class EasyExerciseProvider(ExerciseProvider):
         course_id, ex_id = match.group(1), match.group(2)
         return self._get_ex_description(course_id, ex_id)
 
+    def _show_submission_list(self, form_data, match):
+        course_id, ex_id = match.group(1), match.group(2)
+        # "Show older" button asks for more than it was shown before
+        limit = max(int(form_data.get("limit", SUBMISSIONS_PAGE_SIZE)), SUBMISSIONS_PAGE_SIZE)
+        return self._get_submission_list(course_id, ex_id, limit)
+
     def _show_exercise_list(self, match):
         course_id = match.group(1)
         return self._get_ex_list(course_id)
@@ -152,71 +246,203 @@ class EasyExerciseProvider(ExerciseProvider):
         return generate_course_list_html(self.easy.student.get_courses().courses), [self._breadcrumb_courses()]
 
     def _get_ex_list(self, course_id: str):
-        exercises = self.easy.student.get_course_exercises(course_id).exercises
-        breadcrumb_ex_list = self._breadcrumb_exercises(course_id)
-        html = generate_exercise_list_html(breadcrumb_ex_list[0], exercises)
+        results = self._call_concurrently({
+            "exercises": (self.easy.student.get_course_exercises, course_id),
+            "course_info": (self.easy.common.get_course_basic_info, course_id),
+        })
+        breadcrumb_ex_list = self._breadcrumb_exercises(course_id, results["course_info"].title)
+        html = generate_exercise_list_html(breadcrumb_ex_list[0], results["exercises"].exercises)
         return html, [self._breadcrumb_courses(), breadcrumb_ex_list]
 
-    def _get_ex_description(self, course_id: str, exercise_id: str):
-        details = self.easy.student.get_exercise_details(course_id, exercise_id)
+    def _get_ex_description(self, course_id: str, exercise_id: str, sequentially=False):
+        results = self._call_concurrently({
+            "details": (self.easy.student.get_exercise_details, course_id, exercise_id),
+            "course_info": (self.easy.common.get_course_basic_info, course_id),
+            "latest_submission": (self.easy.student.get_latest_submission, course_id, exercise_id),
+        }, sequentially)
+        details = results["details"]
+        latest = results["latest_submission"]
+        if latest is None:
+            latest = SubmissionResp()
+
         breadcrumb_this = (f"/student/courses/{course_id}/exercises/{exercise_id}", details.effective_title)
-        breadcrumbs = [self._breadcrumb_courses(), self._breadcrumb_exercises(course_id), breadcrumb_this]
-        return generate_exercise_html(self, course_id, exercise_id), breadcrumbs
+        breadcrumbs = [self._breadcrumb_courses(),
+                       self._breadcrumb_exercises(course_id, results["course_info"].title),
+                       breadcrumb_this]
+        html = generate_exercise_html(details, latest, self._get_submission_state(course_id, exercise_id),
+                                      course_id, exercise_id, self.easy.util.idp_client_name)
+        return html, breadcrumbs
+
+    def _get_submission_list(self, course_id: str, exercise_id: str, limit: int):
+        # Pages shown before come from the cache, so only the new page is actually loaded
+        offsets = range(0, limit, SUBMISSIONS_PAGE_SIZE)
+        calls = {
+            "details": (self.easy.student.get_exercise_details, course_id, exercise_id),
+            "course_info": (self.easy.common.get_course_basic_info, course_id),
+        }
+        for offset in offsets:
+            calls[f"submissions_{offset}"] = (self.easy.student.get_submissions_page,
+                                              course_id, exercise_id, offset, SUBMISSIONS_PAGE_SIZE)
+        results = self._call_concurrently(calls)
+
+        submissions = []
+        for offset in offsets:
+            submissions.extend(results[f"submissions_{offset}"].submissions)
+        last_page = results[f"submissions_{offsets[-1]}"]
+        if last_page.count is not None:
+            has_more = len(submissions) < last_page.count
+        else:
+            has_more = len(last_page.submissions) == SUBMISSIONS_PAGE_SIZE
+
+        exercise_url = f"/student/courses/{course_id}/exercises/{exercise_id}"
+        breadcrumbs = [self._breadcrumb_courses(),
+                       self._breadcrumb_exercises(course_id, results["course_info"].title),
+                       (exercise_url, results["details"].effective_title),
+                       (exercise_url + "/submissions/all", "Esitused")]
+        html = generate_submission_list_html(submissions, has_more, len(submissions) + SUBMISSIONS_PAGE_SIZE,
+                                             course_id, exercise_id)
+        return html, breadcrumbs
+
+    def _call_concurrently(self, calls: Dict[str, Tuple], sequentially=False) -> Dict[str, Any]:
+        """Makes independent backend calls (function and arguments by names) at the same time.
+
+        Returns results by names, when all calls have completed.
+        With sequentially=True the calls are made one by one in the calling thread instead,
+        so that they don't occupy the threads shared by page loads.
+        """
+        durations = {}
+
+        def timed_call(name, func, *args):
+            start_time = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                durations[name] = (time.perf_counter() - start_time) * 1000
+
+        start_time = time.perf_counter()
+        futures = {}
+        try:
+            if sequentially:
+                return {name: timed_call(name, *call) for name, call in calls.items()}
+
+            futures = {name: self._backend_executor.submit(timed_call, name, *call) for name, call in calls.items()}
+            return {name: fut.result() for name, fut in futures.items()}
+        finally:
+            concurrent.futures.wait(futures.values())
+            breakdown = ", ".join(f"{name} {duration:.0f} ms" for name, duration in durations.items())
+            logger.info(f"Backend calls took {(time.perf_counter() - start_time) * 1000:.0f} ms ({breakdown})")
+
+    def suspend(self):
+        # Requests made for showing a page still work
+        self._token_refresher.suspend()
+        self._grade_poller.suspend()
+        self._submission_queue.suspend()
+        self.easy.cache.suspend()
+        self._update_checker.suspend()
+
+    def resume(self):
+        self._token_refresher.resume()
+        self._grade_poller.resume()
+        self._submission_queue.resume()
+        self.easy.cache.resume()
+        self._update_checker.resume()
+
+    def accept_form(self, url: str, form_data: FormData):
+        match = SUBMIT_SOLUTION_RE.fullmatch(url)
+        if match is not None:
+            self._submit_solution(match.group(1), match.group(2), form_data.get(EDITOR_CONTENT_NAME))
+
+    def _submit_solution(self, course_id: str, exercise_id: str, solution: str):
+        # Runs in UI thread. Sent in the background, the page shows the state of the submission.
+        self._direct_submission_states.pop((course_id, exercise_id), None)
+        try:
+            self._submission_queue.add(course_id, exercise_id, solution)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not queue submission to exercise {exercise_id}: '{e}'. Sending it directly.")
+            self._direct_submission_states[(course_id, exercise_id)] = {"state": SENDING, "attempts": 0,
+                                                                        "error": None}
+            threading.Thread(target=self._post_submission_directly, args=(course_id, exercise_id, solution),
+                             daemon=True, name="LahendusDirectSubmission").start()
+
+    def _post_submission_directly(self, course_id: str, exercise_id: str, solution: str):
+        try:
+            self._post_submission(course_id, exercise_id, solution)
+        except Exception as e:
+            logger.warning(f"Submission to exercise {exercise_id} failed: '{e}'")
+            self._direct_submission_states[(course_id, exercise_id)] = {"state": FAILED, "attempts": 1,
+                                                                        "error": str(e)}
+            self._on_submission_state_change(course_id, exercise_id, FAILED)
+        else:
+            logger.info(f"Submission to exercise {exercise_id} was accepted")
+            # page shows the submission itself
+            self._direct_submission_states.pop((course_id, exercise_id), None)
+            self._on_submission_state_change(course_id, exercise_id, ACCEPTED)
+
+    def _get_submission_state(self, course_id: str, exercise_id: str):
+        direct_state = self._direct_submission_states.get((course_id, exercise_id))
+        if direct_state is not None:
+            return direct_state
+        return self._submission_queue.get_state(course_id, exercise_id)
+
+    def _post_submission(self, course_id: str, exercise_id: str, solution: str):
+        # Runs in submission queue's thread
+        self.easy.student.post_submission(course_id, exercise_id, solution)
+
+    def _on_submission_state_change(self, course_id: str, exercise_id: str, state: str):
+        if state == ACCEPTED:
+            # Autograding is asynchronous. The page gets updated again when the grade arrives.
+            self._grade_poller.start(course_id, exercise_id)
 
-    def _submit_solution(self, course_id: str, exercise_id: str, form_data):
-        self.easy.student.post_submission(course_id, exercise_id, form_data.get(EDITOR_CONTENT_NAME))
-        return self._get_ex_description(course_id, exercise_id)
+        self.exercises_view.notify_content_changed(f"/student/courses/{course_id}/exercises/{exercise_id}")
 
-    def _breadcrumb_exercises(self, course_id: str) -> Tuple[str, str]:
-        return f"/student/courses/{course_id}/exercises/", self.easy.common.get_course_basic_info(course_id).title
+    def _fetch_latest_submission(self, course_id: str, exercise_id: str):
+        # Runs in a background thread. Fetched response replaces the cached one.
+        self.easy.cache.invalidate("get_latest_submission", course_id, exercise_id)
+        return self.easy.student.get_latest_submission(course_id, exercise_id)
+
+    def _on_graded(self, course_id: str, exercise_id: str):
+        for endpoint in SUBMISSION_ENDPOINTS:
+            if endpoint != "get_latest_submission":
+                self.easy.cache.invalidate(endpoint, course_id, exercise_id)
+
+        # Page gets rebuilt from cached data, and only its submission section gets replaced
+        self.exercises_view.notify_content_changed(f"/student/courses/{course_id}/exercises/{exercise_id}")
+
+    @staticmethod
+    def _breadcrumb_exercises(course_id: str, course_title: str) -> Tuple[str, str]:
+        return f"/student/courses/{course_id}/exercises/", course_title
 
     @staticmethod
     def _breadcrumb_courses() -> Tuple[str, str]:
         return f"/student/courses/", "Kursused"
 
-    def get_menu_items(self) -> List[Tuple[str, Union[str, Callable, None]]]:
-        return [("Logi sisse", AUTH_PATH) if self.easy.is_auth_required() else ("Logi välja", LOGOUT_PATH)]
+    def is_revisitable(self, url: str) -> bool:
+        return url not in (AUTH_PATH, AUTH_PATH_CANCEL, LOGOUT_PATH)
 
-    @staticmethod
-    def _get_versions():
-        logger.info("Getting the installed plugin-in version info via pkg_resources...")
-        installed_version = pkg_resources.require("thonny-lahendus")[0].version
-
-        logger.info("Getting the latest plugin-in version info via pypi...")
-        resp: requests.Response = requests.get("https://pypi.org/pypi/thonny-lahendus/json")
-        latest_version = resp.json()["info"]["version"]
-
-        versions = {"current": installed_version, "latest": latest_version}
-        logger.info(f"Plug-in version info: {versions}")
-        return versions
-
-    def _update_required(self):
-        def minutes_passed(oldepoch, minutes: int):
-            if oldepoch is None:
-                return True
-            return time.time() - oldepoch >= 60 * minutes
-
-        check_every = 10
-        check_required = minutes_passed(self.last_update_check, check_every)
-
-        if not check_required:
-            logger.info(f"Skipping plug-in update check as {check_every} minutes are not passed from the last check.")
-            return False
-
-        logger.info("Checking for plug-in update...")
-        versions = self._get_versions()
-        major_installed, minor_installed, patch_installed = tuple(map(int, versions["current"].split(".")))
-        major_latest, minor_latest, patch_latest = tuple(map(int, versions["latest"].split(".")))
-
-        update_required = major_installed < major_latest
-        if not update_required:
-            logger.info(f"Version '{major_installed}' < '{major_latest}' is {update_required}, no update required.")
-        else:
-            logger.info(f"Version '{major_installed}' < '{major_latest}' is {update_required}, update required.")
+    def is_prefetchable(self, url: str) -> bool:
+        return EXERCISE_DESCRIPTION_RE.fullmatch(url) is not None
 
-        self.last_update_check = time.time()
+    def get_prefetch_urls(self, url: str) -> List[str]:
+        match = EXERCISE_DESCRIPTION_RE.fullmatch(url)
+        if match is None:
+            return []
 
-        return update_required
+        # next exercise of the course
+        course_id, exercise_id = match.group(1), match.group(2)
+        exercise_ids = [str(e["id"]) for e in self.easy.student.get_course_exercises(course_id).exercises]
+        if exercise_id in exercise_ids and exercise_ids.index(exercise_id) + 1 < len(exercise_ids):
+            return [f"/student/courses/{course_id}/exercises/{exercise_ids[exercise_ids.index(exercise_id) + 1]}"]
+        return []
+
+    def prefetch(self, url: str) -> List[str]:
+        # Bypasses get_html_and_breadcrumbs, as this is not a user query
+        match = EXERCISE_DESCRIPTION_RE.fullmatch(url)
+        # Runs in the prefetch lane, and must not delay backend calls of the pages student opens
+        html, _ = self._get_ex_description(match.group(1), match.group(2), sequentially=True)
+        return parse_html(html).get_image_urls()
+
+    def get_menu_items(self) -> List[Tuple[str, Union[str, Callable, None]]]:
+        return [("Logi sisse", AUTH_PATH) if self.easy.is_auth_required() else ("Logi välja", LOGOUT_PATH)]
 
     @staticmethod
     def log_match(matched_action: str, url: str, form_data: FormData):
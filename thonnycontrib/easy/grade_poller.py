@@ -0,0 +1,104 @@
+import logging
+import threading
+from typing import Callable, Optional
+
+from easy import SubmissionResp
+
+from .templates_generator import is_grading_in_progress
+
+logger = logging.getLogger(__name__)
+
+# Delays (in seconds) between polls grow from the first to the max delay
+FIRST_POLL_DELAY = 1
+MAX_POLL_DELAY = 30
+BACKOFF_FACTOR = 2
+# Polling is given up after this time (in seconds), the student can still reload the page
+MAX_POLLING_TIME = 5 * 60
+
+
+class GradePoller:
+    """Waits in the background for the automatic grade of a submission.
+
+    Only the latest submission gets polled, with growing delays, so that a class submitting
+    at the same time doesn't flood the backend with page reloads.
+    """
+
+    def __init__(self, get_latest_submission: Callable[[str, str], Optional[SubmissionResp]],
+                 on_graded: Callable[[str, str], None]):
+        self._get_latest_submission = get_latest_submission
+        self._on_graded = on_graded
+        self._lock = threading.Lock()
+        self._stop_events = {}  # (course_id, exercise_id) -> Event of the polling thread
+        self._suspended = False
+        # polled again after resume
+        self._suspended_keys = set()
+
+    def start(self, course_id: str, exercise_id: str):
+        """Starts polling, unless the exercise is being polled already"""
+        key = (course_id, exercise_id)
+        with self._lock:
+            if self._suspended:
+                self._suspended_keys.add(key)
+                return
+            if key in self._stop_events:
+                return
+            stop_event = threading.Event()
+            self._stop_events[key] = stop_event
+
+        threading.Thread(target=self._poll, args=(course_id, exercise_id, stop_event), daemon=True,
+                         name="LahendusGradePoller").start()
+
+    def stop_all(self):
+        with self._lock:
+            for stop_event in self._stop_events.values():
+                stop_event.set()
+            self._stop_events.clear()
+            self._suspended_keys.clear()
+
+    def suspend(self):
+        """Stops polling until resume"""
+        with self._lock:
+            self._suspended = True
+            self._suspended_keys.update(self._stop_events)
+            for stop_event in self._stop_events.values():
+                stop_event.set()
+            self._stop_events.clear()
+
+    def resume(self):
+        """Starts polling again (from the shortest delay) the exercises polled before suspend"""
+        with self._lock:
+            self._suspended = False
+            keys = self._suspended_keys
+            self._suspended_keys = set()
+
+        for course_id, exercise_id in keys:
+            self.start(course_id, exercise_id)
+
+    def _poll(self, course_id, exercise_id, stop_event):
+        delay = FIRST_POLL_DELAY
+        waited = 0
+        poll_count = 0
+        try:
+            while waited < MAX_POLLING_TIME:
+                if stop_event.wait(delay):
+                    return
+                waited += delay
+                delay = min(delay * BACKOFF_FACTOR, MAX_POLL_DELAY)
+                poll_count += 1
+
+                try:
+                    latest = self._get_latest_submission(course_id, exercise_id)
+                except Exception as e:
+                    logger.info(f"Could not poll grade of exercise {exercise_id}: '{e}'")
+                    continue
+
+                if latest is not None and not is_grading_in_progress(latest):
+                    logger.info(f"Grade of exercise {exercise_id} arrived after {poll_count} polls")
+                    self._on_graded(course_id, exercise_id)
+                    return
+
+            logger.info(f"Gave up polling grade of exercise {exercise_id} after {poll_count} polls")
+        finally:
+            with self._lock:
+                if self._stop_events.get((course_id, exercise_id)) is stop_event:
+                    del self._stop_events[(course_id, exercise_id)]
@@ -1,5 +1,10 @@
+import hashlib
 import os.path
 import platform
+import re
+import threading
+import time
+from collections import OrderedDict
 
 import tkinter as tk
 import tkinter.font as tkfont
@@ -13,13 +18,39 @@ from thonny.codeview import get_syntax_options_for_tag
 NBSP = "\u00A0"
 UL_LI_MARKER = "•" + NBSP
 VERTICAL_SPACER = NBSP + "\n"
+# Block elements, which are separated from previous content by VERTICAL_SPACER
+SPACER_BLOCK_TAGS = ("p", "ul", "ol", "summary", "details", "table", "pre")
 VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input",
              "link", "meta", "param", "command", "keygen", "source"}
 
+# Parts of a document separated by these markers are parsed (and cached) independently
+# and can be updated independently in the widget
+SECTION_MARKER_RE = re.compile(r"<!--\s*section:\s*([\w-]+)\s*-->")
+TOP_SECTION_KEY = "_top"
+
+# Kinds of DisplayList items
+TEXT = "text"
+IMAGE = "image"
+WINDOW = "window"
+COLLAPSED = "collapsed"
+SECTION = "section"
+
+# <pre> and <code> blocks longer than this are shown as a preview, rest is inserted on request
+DEFAULT_MAX_BLOCK_LINES = 100
+COLLAPSED_BLOCK_PREVIEW_LINES = 10
+
 _image_placeholder = None
 
+# Progressive rendering inserts at most this much (in seconds) per event loop iteration
+RENDERING_SLICE_DURATION = 0.01
+
+# Equal tag contexts share a single effective tags tuple
+_tag_tuples_by_context = {}
+MAX_TAG_CONTEXTS = 4096
+
 class HtmlText(tktextext.TweakableText):
-    def __init__(self, master, renderer_class, link_and_form_handler, image_requester, read_only=False, **kw):
+    def __init__(self, master, renderer_class, link_and_form_handler, image_requester, read_only=False,
+                 link_hover_handler=None, **kw):
 
         text_options = get_syntax_options_for_tag("TEXT")
 
@@ -38,26 +69,48 @@ class HtmlText(tktextext.TweakableText):
         self._renderer_class = renderer_class
         self._link_and_form_handler = link_and_form_handler
         self._image_requester = image_requester
+        self._link_hover_handler = link_hover_handler
+        self._link_targets = {}
         self._configure_tags()
         self._reset_renderer()
 
     def set_html_content(self, html):
+        self.set_display_list(parse_html(html))
+
+    def set_display_list(self, display_list, progressive=False):
+        """In progressive mode only the first screenful is inserted immediately,
+        the rest is inserted piecewise when Tk is idle."""
         self.clear()
-        self._renderer.feed(html)
-        if platform.system() == "Darwin":
-            self._replace_nbsps_with_spaces()
-
-    def _replace_nbsps_with_spaces(self):
-        # NBSP doesn't work properly in Mac, but during rendering
-        # HTML it's useful to keep it separate form regular space.
-        start = "1.0"
-        while True:
-            match = self.search(NBSP, start, exact=True, forwards=True)
-            if not match:
-                break
-            self.direct_delete(match)
-            self.direct_insert(match, " ")
-            start = match + " +1 c"
+        self._renderer.render(display_list, progressive)
+
+    def update_display_list(self, display_list):
+        """Replaces only the sections which have changed (keeping scroll position,
+        images and widgets of others). Falls back to full rendering if needed."""
+        if not self._renderer.update(display_list):
+            self.set_display_list(display_list, progressive=True)
+
+    def has_keyed_sections(self):
+        return self._renderer.has_keyed_sections()
+
+    def get_image_names(self):
+        return self._renderer.get_image_names()
+
+    def get_image_distances(self):
+        return self._renderer.get_image_distances()
+
+    def cancel_rendering(self):
+        self._renderer.cancel()
+
+    def estimate_visible_line_count(self):
+        linespace = tkfont.nametofont("TkDefaultFont").metrics("linespace")
+        # before the widget gets mapped its height is meaningless
+        return max(self.winfo_height() // linespace, int(self.cget("height"))) + 1
+
+    def direct_insert_runs(self, index, runs):
+        """Inserts alternating chars and tags (like Text.insert) with a single Tk call"""
+        self._original_insert(index, *runs)
+        if not self._suppress_events:
+            self.event_generate("<<TextChange>>")
 
     def _configure_tags(self):
         main_font = tkfont.nametofont("TkDefaultFont")
@@ -133,6 +186,14 @@ class HtmlText(tktextext.TweakableText):
         # if ui_utils.get_tk_version_info() >= (8,6,6):
         #    self.tag_configure("code", lmargincolor=self["background"])
 
+        self.tag_configure(
+            "collapsed",
+            **{**get_syntax_options_for_tag("hyperlink"), "underline": False},
+            font=underline_font
+        )
+        self.tag_bind("collapsed", "<Enter>", self._hyperlink_enter)
+        self.tag_bind("collapsed", "<Leave>", self._hyperlink_leave)
+
         li_indent = main_font.measure("m")
         li_bullet_width = main_font.measure(UL_LI_MARKER)
         for i in range(1, 6):
@@ -150,41 +211,241 @@ class HtmlText(tktextext.TweakableText):
         self._renderer = self._renderer_class(self, self._link_and_form_handler, self._image_requester)
 
     def clear(self):
+        self._renderer.dispose()
         self.direct_delete("1.0", "mark")
         self.tag_delete("1.0", "mark")
+        if self._link_targets:
+            self.tag_delete(*self._link_targets)
+            self._link_targets = {}
         self._reset_renderer()
 
-    def _hyperlink_click(self, event):
+    def register_links(self, targets_by_tag):
+        self._link_targets.update(targets_by_tag)
+
+    def _get_link_target(self, event):
         mouse_index = self.index("@%d,%d" % (event.x, event.y))
 
         for tag in self.tag_names(mouse_index):
-            # formatting tags are alphanumeric
-            if self._renderer._is_link_tag(tag):
-                self._link_and_form_handler(tag)
-                break
+            target = self._link_targets.get(tag)
+            if target is not None:
+                return target
+
+        return None
+
+    def _hyperlink_click(self, event):
+        target = self._get_link_target(event)
+        if target is not None:
+            self._link_and_form_handler(target)
 
     def _hyperlink_enter(self, event):
         self.config(cursor="hand2")
+        if self._link_hover_handler is not None:
+            self._link_hover_handler(self._get_link_target(event))
 
     def _hyperlink_leave(self, event):
         self.config(cursor="")
+        if self._link_hover_handler is not None:
+            self._link_hover_handler(None)
 
     def update_image(self, name, data):
         self._renderer.update_image(name, data)
 
-class HtmlRenderer(HTMLParser):
-    def __init__(self, text_widget, link_and_form_handler, image_requester):
-        super().__init__()
-        self.widget = text_widget
+class DisplayList:
+    """Result of parsing a HTML document.
+
+    Consists of plain-Python items in document order:
+        [TEXT, chars, tags]
+        [IMAGE, src, tags]
+        [WINDOW, kind, attrs, form, tags]
+        [COLLAPSED, hidden_items, hidden_line_count, tags]
+        [SECTION, key, signature]  (start of a section, see parse_html)
+
+    Hyperlinks are marked with generated tags, links maps these to hrefs.
+
+    Can be created in any thread. Only HtmlRenderer needs the UI thread.
+    """
+
+    def __init__(self, items=None, links=None):
+        if items is None:
+            items = []
+        if links is None:
+            links = {}
+        self.items = items
+        self.links = links
+        # Whether the first block divider would have added a vertical spacer, if it weren't at the start.
+        # Used when joining independently built sections.
+        self.starts_with_spacer_block = False
+
+    def get_image_urls(self):
+        result = []
+        items = self.items
+        while items:
+            nested_items = []
+            for item in items:
+                if item[0] == IMAGE and item[1] not in result:
+                    result.append(item[1])
+                elif item[0] == COLLAPSED:
+                    nested_items.extend(item[1])
+            items = nested_items
 
-        # inserting at "end" acts funny, so I'm creating a mark instead
-        self.widget.direct_insert("end", "\n")
-        self.widget.mark_set("mark", "1.0")
-        self._images_by_name = {}
+        return result
+
+
+class LayoutCache:
+    """LRU cache of parsed fragments keyed by hash of the fragment's HTML.
+
+    Cached display lists are shared, so they must not be modified after building.
+    """
+
+    def __init__(self, max_size=64):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._fragments_by_digest = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_fragment(self, html, max_block_lines=DEFAULT_MAX_BLOCK_LINES, digest=None) -> "DisplayList":
+        if digest is None:
+            digest = get_fragment_digest(html, max_block_lines)
+
+        with self._lock:
+            fragment = self._fragments_by_digest.get(digest)
+            if fragment is not None:
+                self._fragments_by_digest.move_to_end(digest)
+                self.hits += 1
+                return fragment
+
+            self.misses += 1
+
+        # parse outside of the lock, so that other threads don't need to wait
+        fragment = DisplayListBuilder(max_block_lines).build(html)
+
+        with self._lock:
+            self._fragments_by_digest[digest] = fragment
+            while len(self._fragments_by_digest) > self.max_size:
+                self._fragments_by_digest.popitem(last=False)
+
+        return fragment
+
+    def get_stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._fragments_by_digest)}
+
+    def clear(self):
+        with self._lock:
+            self._fragments_by_digest.clear()
+
+
+layout_cache = LayoutCache()
+
+
+def get_fragment_digest(html, max_block_lines):
+    return hashlib.sha1(html.encode("utf-8")).hexdigest() + ":%s" % max_block_lines
+
+
+def split_sections(html) -> List[Tuple[str, str]]:
+    """Returns (key, html) pairs. Content before first marker gets TOP_SECTION_KEY."""
+    parts = SECTION_MARKER_RE.split(html)
+    keys = [TOP_SECTION_KEY] + parts[1::2]
+    result = []
+    used_keys = set()
+    for key, fragment in zip(keys, parts[0::2]):
+        if not fragment.strip():
+            continue
+
+        unique_key = key
+        while unique_key in used_keys:
+            unique_key += "_"
+        used_keys.add(unique_key)
+        result.append((unique_key, fragment))
+
+    return result
+
+
+def parse_html(html, cache=layout_cache, max_block_lines=DEFAULT_MAX_BLOCK_LINES) -> DisplayList:
+    """Can be called from any thread.
+
+    Each section starts with a SECTION item, whose signature changes iff the items of the section change.
+    """
+    items = []
+    links = {}
+    section_item = None
+    for key, html_fragment in split_sections(html):
+        digest = get_fragment_digest(html_fragment, max_block_lines)
+        if cache is None:
+            fragment = DisplayListBuilder(max_block_lines).build(html_fragment)
+        else:
+            fragment = cache.get_fragment(html_fragment, max_block_lines, digest)
+
+        fragment_items = fragment.items
+        spaced = False
+        if fragment_items and fragment_items[0][0] == TEXT and fragment_items[0][1].startswith("\n"):
+            # Sections are built independently. Do here what the block divider
+            # would have done with the trailing whitespace of previous section ...
+            if _strip_trailing_whitespace(items):
+                section_item[2] += ":stripped"
+
+            # ... and with the vertical spacer
+            if fragment.starts_with_spacer_block and _needs_vertical_spacer(items):
+                first = fragment_items[0]
+                fragment_items = ([[TEXT, "\n", first[2]], [TEXT, _get_vertical_spacer(), ()]]
+                                  + ([[TEXT, first[1][1:], first[2]]] if len(first[1]) > 1 else [])
+                                  + fragment_items[1:])
+                spaced = True
+
+        section_item = [SECTION, key, digest + (":spaced" if spaced else "")]
+        items.append(section_item)
+        items.extend(fragment_items)
+        links.update(fragment.links)
+
+    return DisplayList(items, links)
+
+
+def _get_vertical_spacer():
+    # see DisplayListBuilder.build
+    return VERTICAL_SPACER.replace(NBSP, " ") if platform.system() == "Darwin" else VERTICAL_SPACER
+
+
+def _needs_vertical_spacer(items):
+    """Whether a spacer block starting after items (already stripped of trailing whitespace)
+    would get a vertical spacer in a whole-document build"""
+    text_items = [item for item in items if item[0] == TEXT]
+    if not text_items or not any("\n" in item[1] for item in text_items):
+        # on first line
+        return False
+
+    return text_items[-1][1][-1:] + "\n" != _get_vertical_spacer()
+
+
+def _strip_trailing_whitespace(items):
+    """Returns whether anything was stripped"""
+    # Items may be shared with the cache, so they are replaced, not modified
+    stripped = False
+    while items and items[-1][0] == TEXT:
+        chars = items[-1][1].rstrip(" \t\r\n")
+        if chars != items[-1][1]:
+            stripped = True
+
+        if chars:
+            items[-1] = [TEXT, chars, items[-1][2]]
+            break
+        items.pop()
+
+    return stripped
+
+
+class DisplayListBuilder(HTMLParser):
+    """Parses HTML and normalizes whitespace without touching Tk"""
+
+    def __init__(self, max_block_lines=DEFAULT_MAX_BLOCK_LINES):
+        super().__init__()
+        self._items = []
+        self._links = {}
+        self._newline_count = 0
+        self._max_block_lines = max_block_lines
+        self._long_block_candidate = None  # (tag, position of first item)
+        self._starts_with_spacer_block = False
 
-        self._link_and_form_handler = link_and_form_handler
-        self._image_requester = image_requester
-        self._unique_tag_count = 0
         self._context_tags = ["_base_"]
         self._active_lists = []
         self._active_ol_item_counts = []
@@ -195,6 +456,26 @@ class HtmlRenderer(HTMLParser):
         self._ignored_tags = ["span"]
         self._active_attrs_by_tag = {}  # assuming proper close tags
 
+    def build(self, html) -> DisplayList:
+        self.feed(html)
+        self.close()
+
+        if platform.system() == "Darwin":
+            # NBSP doesn't work properly in Mac, but during rendering
+            # HTML it's useful to keep it separate form regular space.
+            self._replace_nbsps_with_spaces(self._items)
+
+        result = DisplayList(self._items, self._links)
+        result.starts_with_spacer_block = self._starts_with_spacer_block
+        return result
+
+    def _replace_nbsps_with_spaces(self, items):
+        for item in items:
+            if item[0] == TEXT:
+                item[1] = item[1].replace(NBSP, " ")
+            elif item[0] == COLLAPSED:
+                self._replace_nbsps_with_spaces(item[1])
+
     def handle_starttag(self, tag, attrs):
         self._close_void_tags()
         tag = self._normalize_tag(tag)
@@ -209,8 +490,11 @@ class HtmlRenderer(HTMLParser):
 
         self._add_tag(tag)
 
+        if tag in ("pre", "code") and self._long_block_candidate is None:
+            self._long_block_candidate = (tag, len(self._items))
+
         if tag == "a" and "href" in attrs:
-            self._add_tag(attrs["href"])
+            self._add_tag(self._create_link_tag(attrs["href"]))
         elif tag == "ul":
             self._active_lists.append("ul")
         elif tag == "ol":
@@ -262,6 +546,12 @@ class HtmlRenderer(HTMLParser):
 
         self._pop_tag(tag)
 
+        if (self._long_block_candidate is not None
+                and self._long_block_candidate[0] == tag
+                and tag not in self._context_tags):
+            self._collapse_long_block(self._long_block_candidate[1])
+            self._long_block_candidate = None
+
         # prepare for next piece of text
         if tag in self._block_tags:
             self._add_block_divider(tag)
@@ -273,12 +563,11 @@ class HtmlRenderer(HTMLParser):
     def _close_void_tags(self):
         self._context_tags = [tag for tag in self._context_tags if tag not in VOID_TAGS]
 
-    def _is_link_tag(self, tag):
-        return ":" in tag or "/" in tag or "!" in tag
-
-    def _create_unique_tag(self):
-        self._unique_tag_count += 1
-        return "_UT_%s" % self._unique_tag_count
+    def _create_link_tag(self, href):
+        # Derived from href, so that independently built sections agree on the tags
+        tag = "_link_" + hashlib.sha1(href.encode("utf-8")).hexdigest()[:12]
+        self._links[tag] = href
+        return tag
 
     def _normalize_tag(self, tag):
         return self._alternatives.get(tag, tag)
@@ -286,25 +575,144 @@ class HtmlRenderer(HTMLParser):
     def _add_tag(self, tag):
         self._context_tags.append(tag)
 
+    def _last_char(self):
+        # Like Text.get("mark-1c"), ie. embedded images and windows give ""
+        if not self._items:
+            return ""
+
+        item = self._items[-1]
+        if item[0] == TEXT:
+            return item[1][-1]
+        else:
+            return ""
+
+    def _last_tags(self):
+        if not self._items:
+            return ()
+
+        return self._items[-1][-1]
+
+    def _get_tail(self, char_count):
+        # Like Text.get("mark-%dc" % char_count, "mark")
+        result = ""
+        for item in reversed(self._items):
+            if item[0] == TEXT:
+                result = item[1][-char_count:] + result
+                char_count -= min(char_count, len(item[1]))
+            else:
+                char_count -= 1
+
+            if char_count == 0:
+                break
+
+        return result
+
+    def _last_char_is_on_first_line(self):
+        # Like Text.index("mark-1c linestart") == "1.0"
+        newlines_before_last = self._newline_count
+        if self._last_char() == "\n":
+            newlines_before_last -= 1
+
+        return newlines_before_last == 0
+
+    def _delete_last_char(self):
+        item = self._items[-1]
+        assert item[0] == TEXT
+        if item[1][-1] == "\n":
+            self._newline_count -= 1
+
+        if len(item[1]) == 1:
+            self._items.pop()
+        else:
+            item[1] = item[1][:-1]
+
+    def _insert_text(self, chars, tags=()):
+        if chars:
+            self._items.append([TEXT, chars, tags])
+            self._newline_count += chars.count("\n")
+
+    def _insert_embedded(self, item):
+        # Embedded objects go in front of last character (mimicking the original
+        # Text.image_create("mark-1c", ...) behaviour)
+        if not self._items:
+            self._items.append(item)
+            return
+
+        last = self._items[-1]
+        if last[0] == TEXT and len(last[1]) > 1:
+            self._items[-1] = [TEXT, last[1][:-1], last[2]]
+            self._items.append(item)
+            self._items.append([TEXT, last[1][-1], last[2]])
+        else:
+            self._items.insert(len(self._items) - 1, item)
+
+    def _collapse_long_block(self, start):
+        # whitespace handling before the block may have consumed some items
+        start = min(start, len(self._items))
+        block = self._items[start:]
+        line_count = sum(item[1].count("\n") for item in block if item[0] == TEXT)
+        if line_count <= self._max_block_lines:
+            return
+
+        preview = []
+        remaining_lines = min(COLLAPSED_BLOCK_PREVIEW_LINES, self._max_block_lines)
+        position = 0
+        while remaining_lines > 0:
+            item = block[position]
+            position += 1
+            if item[0] == TEXT and item[1].count("\n") >= remaining_lines:
+                split_point = 0
+                for _ in range(remaining_lines):
+                    split_point = item[1].index("\n", split_point) + 1
+                preview.append([TEXT, item[1][:split_point], item[2]])
+                if split_point < len(item[1]):
+                    position -= 1
+                    block[position] = [TEXT, item[1][split_point:], item[2]]
+                break
+
+            preview.append(item)
+            if item[0] == TEXT:
+                remaining_lines -= item[1].count("\n")
+
+        hidden = block[position:]
+
+        # trailing whitespace stays visible, so that following content can deal with it as usual
+        trailing = []
+        while hidden and hidden[-1][0] == TEXT:
+            chars = hidden[-1][1]
+            stripped = chars.rstrip(" \t\r\n")
+            if stripped != chars:
+                trailing.insert(0, [TEXT, chars[len(stripped):], hidden[-1][2]])
+            if stripped:
+                hidden[-1] = [TEXT, stripped, hidden[-1][2]]
+                break
+            hidden.pop()
+
+        if not hidden:
+            return
+
+        hidden_line_count = sum(item[1].count("\n") for item in hidden if item[0] == TEXT)
+        self._newline_count -= hidden_line_count
+        self._items[start:] = preview + [[COLLAPSED, hidden, hidden_line_count + 1, hidden[0][-1]]] + trailing
+
     def _add_block_divider(self, tag):
         if tag == "p" and self._context_tags and self._context_tags[-1] == "li":
             return
 
         # replace all trailing whitespace with a single linebreak
-        while self.widget.get("mark-1c", "mark") in ["\r", "\n", "\t", " "]:
-            self.widget.direct_delete("mark-1c")
+        while self._last_char() in ["\r", "\n", "\t", " "]:
+            self._delete_last_char()
 
-        self.widget.direct_insert("mark", "\n",
-                                  tags=[tag for tag in self.widget.tag_names("mark-1c")
-                                  if tag in self._block_tags])
+        if not self._items and tag in SPACER_BLOCK_TAGS:
+            self._starts_with_spacer_block = True
 
-        # For certain tags add vertical spacer (if it's not there already)
-        if (tag in ("p", "ul", "ol", "summary", "details", "table", "pre")
-                and self.widget.get("mark-2c", "mark") != VERTICAL_SPACER
-                and self.widget.index("mark-1c linestart") != "1.0"):
-            self.widget.direct_insert("mark", VERTICAL_SPACER)
+        self._insert_text("\n", tuple(tag for tag in self._last_tags() if tag in self._block_tags))
 
-        # if self.widget.get("mark-1c", "mark") != NBSP:
+        # For certain tags add vertical spacer (if it's not there already)
+        if (tag in SPACER_BLOCK_TAGS
+                and self._get_tail(2) != VERTICAL_SPACER
+                and not self._last_char_is_on_first_line()):
+            self._insert_text(VERTICAL_SPACER)
 
     def _pop_tag(self, tag):
         if tag in VOID_TAGS:
@@ -346,16 +754,16 @@ class HtmlRenderer(HTMLParser):
         return text
 
     def _append_text(self, chars, extra_tags=()):
-        # print("APPP", chars, tags)
         # don't put two horizontal whitespaces next to each other
         trailing_space = False
         trailing_tags = set()
-        while self.widget.get("mark-1c") in (" ", "\t"):
+        while self._last_char() in (" ", "\t"):
             trailing_space = True
-            trailing_tags.update(self.widget.tag_names("mark-1c"))
-            self.widget.direct_delete("mark-1c")
+            trailing_tags.update(self._last_tags())
+            self._delete_last_char()
 
-        last_non_horspace = self.widget.get("mark-1c")
+        # beginning of the document counts as beginning of the line
+        last_non_horspace = self._last_char() if self._items else "\n"
         if last_non_horspace in ["\n", NBSP]:
             # don't keep space in the beginning of the line
             trailing_space = False
@@ -364,22 +772,256 @@ class HtmlRenderer(HTMLParser):
         if (trailing_space and not chars.startswith(" ")
                 and not chars.startswith("\t")):
             # Restore the required space
-            self.widget.direct_insert("mark", " ", tags=tuple(trailing_tags))
+            self._insert_text(" ", tuple(trailing_tags))
 
-        self.widget.direct_insert("mark", chars, self._get_effective_tags(extra_tags))
+        self._insert_text(chars, self._get_effective_tags(extra_tags))
 
     def _append_submit_button(self, attrs):
         form = self._active_forms[-1]
+        self._append_window("submit", attrs, form)
+        if "name" in attrs:
+            form["fields"].append([attrs, attrs.get("value", "Submit")])
+
+    def _add_hidden_form_variable(self, attrs):
+        self._active_forms[-1]["inputs"].append([attrs, attrs.get("value")])
+
+    def _append_file_input(self, attrs):
+        self._append_window("file", attrs)
+
+    def _append_image(self, name, extra_tags=()):
+        assert name is not None
+        self._insert_embedded([IMAGE, name, self._get_effective_tags(extra_tags)])
+
+    def _append_window(self, kind, attrs, form=None, extra_tags=()):
+        self._insert_embedded([WINDOW, kind, attrs, form, self._get_effective_tags(extra_tags)])
+
+    def _get_effective_tags(self, extra_tags):
+        context = (tuple(self._context_tags), min(len(self._active_lists), 5), tuple(extra_tags))
+        tags = _tag_tuples_by_context.get(context)
+        if tags is not None:
+            return tags
+
+        tags = set(extra_tags) | set(self._context_tags)
+
+        if self._active_lists:
+            tags.add("list%d" % min(len(self._active_lists), 5))
 
+        if len(_tag_tuples_by_context) >= MAX_TAG_CONTEXTS:
+            _tag_tuples_by_context.clear()
+
+        return _tag_tuples_by_context.setdefault(context, tuple(sorted(tags)))
+
+
+class HtmlRenderer:
+    """Applies a DisplayList to a HtmlText. Must be used in UI thread."""
+
+    def __init__(self, text_widget, link_and_form_handler, image_requester):
+        self.widget = text_widget
+
+        # inserting at "end" acts funny, so I'm creating a mark instead
+        self.widget.direct_insert("end", "\n")
+        self.widget.mark_set("mark", "1.0")
+        self._images_by_name = {}
+        # Tk deletes an image when its last Python reference is gone, even if it's shown.
+        # Image caches may evict the images, so shown ones are referenced here.
+        self._tk_images_by_name = {}
+
+        self._link_and_form_handler = link_and_form_handler
+        self._image_requester = image_requester
+        self._continuation_ids_by_mark = {}
+        self._collapsed_block_count = 0
+        self._collapsed_block_tags = []
+        self._section_signatures = OrderedDict()
+
+    def feed(self, html):
+        self.render(parse_html(html))
+
+    def render(self, display_list, progressive=False):
+        self.widget.register_links(display_list.links)
+
+        if progressive:
+            max_newlines = self.widget.estimate_visible_line_count()
+        else:
+            max_newlines = None
+
+        position = self._render_items(display_list.items, 0, "mark", max_newlines=max_newlines)
+        if position < len(display_list.items):
+            self._schedule_continuation(display_list.items, position, "mark")
+
+    def update(self, display_list):
+        """Replaces only the sections with changed content.
+
+        Returns False if this is not possible (the sections don't match, or the
+        document is not completely rendered yet).
+        """
+        new_sections = [(position, item[1], item[2]) for position, item in enumerate(display_list.items)
+                        if item[0] == SECTION]
+        if (self._continuation_ids_by_mark
+                or not new_sections
+                or new_sections[0][0] != 0
+                or [key for _, key, _ in new_sections] != list(self._section_signatures)):
+            return False
+
+        self.widget.register_links(display_list.links)
+
+        changed_sections = [i for i, (_, key, signature) in enumerate(new_sections)
+                            if self._section_signatures[key] != signature]
+        if not changed_sections:
+            return True
+
+        # keep the same piece of content at the top of the view
+        self.widget.mark_set("_view_top", "@0,0")
+        self.widget.mark_gravity("_view_top", "left")
+
+        for i in changed_sections:
+            position, key, signature = new_sections[i]
+            if i + 1 < len(new_sections):
+                end_position = new_sections[i + 1][0]
+                end_mark = self._get_section_mark(new_sections[i + 1][1])
+            else:
+                end_position = len(display_list.items)
+                end_mark = "mark"
+
+            self._replace_section(key, display_list.items[position + 1:end_position], end_mark)
+            self._section_signatures[key] = signature
+
+        self.widget.yview("_view_top")
+        self.widget.mark_unset("_view_top")
+        return True
+
+    def has_keyed_sections(self):
+        return any(key != TOP_SECTION_KEY for key in self._section_signatures)
+
+    def _replace_section(self, key, items, end_mark):
+        start_mark = self._get_section_mark(key)
+        # new content must stay in front of the following section
+        self.widget.mark_gravity(end_mark, "right")
+        try:
+            self.widget.direct_delete(start_mark, end_mark)
+            self.widget.mark_set("_section_patch", start_mark)
+            self._render_items(items, 0, "_section_patch")
+            self.widget.mark_unset("_section_patch")
+        finally:
+            if end_mark != "mark":
+                self.widget.mark_gravity(end_mark, "left")
+
+    def _get_section_mark(self, key):
+        return "_section_" + key
+
+    def _start_section(self, key, signature, index_mark):
+        section_mark = self._get_section_mark(key)
+        self.widget.mark_set(section_mark, index_mark)
+        # content of the section will be inserted after the mark
+        self.widget.mark_gravity(section_mark, "left")
+        self._section_signatures[key] = signature
+
+    def cancel(self):
+        """Abandons the parts of the document not inserted yet"""
+        for continuation_id in self._continuation_ids_by_mark.values():
+            self.widget.after_cancel(continuation_id)
+        self._continuation_ids_by_mark = {}
+
+    def dispose(self):
+        self.cancel()
+        for tag in self._collapsed_block_tags:
+            self.widget.mark_unset(tag)
+        if self._collapsed_block_tags:
+            self.widget.tag_delete(*self._collapsed_block_tags)
+        self._collapsed_block_tags = []
+        for key in self._section_signatures:
+            self.widget.mark_unset(self._get_section_mark(key))
+        self._section_signatures = OrderedDict()
+
+    def _schedule_continuation(self, items, position, index_mark):
+        self._continuation_ids_by_mark[index_mark] = self.widget.after_idle(
+            self._continue_rendering, items, position, index_mark)
+
+    def _continue_rendering(self, items, position, index_mark):
+        self._continuation_ids_by_mark.pop(index_mark, None)
+        position = self._render_items(items, position, index_mark,
+                                      deadline=time.perf_counter() + RENDERING_SLICE_DURATION)
+        if position < len(items):
+            self._schedule_continuation(items, position, index_mark)
+
+    def _render_items(self, items, position, index_mark, deadline=None, max_newlines=None):
+        """Inserts items in front of given mark, returns the position of first item not rendered"""
+        # consecutive text runs go to the widget with a single insert
+        runs = []
+        newline_count = 0
+        while position < len(items):
+            item = items[position]
+            position += 1
+            if item[0] == TEXT:
+                runs.append(item[1])
+                runs.append(item[2])
+                if max_newlines is not None:
+                    newline_count += item[1].count("\n")
+            else:
+                self._flush_runs(runs, index_mark)
+                runs = []
+                if item[0] == IMAGE:
+                    self._append_image(item[1], item[2], index_mark)
+                elif item[0] == COLLAPSED:
+                    self._append_collapsed_block(item[1], item[2], item[3], index_mark)
+                elif item[0] == SECTION:
+                    self._start_section(item[1], item[2], index_mark)
+                else:
+                    _, kind, attrs, form, tags = item
+                    window = self._create_window(kind, attrs, form)
+                    self._append_window(window, tags, index_mark)
+
+            if ((deadline is not None and time.perf_counter() > deadline)
+                    or (max_newlines is not None and newline_count >= max_newlines)):
+                break
+
+        self._flush_runs(runs, index_mark)
+        return position
+
+    def _flush_runs(self, runs, index_mark):
+        if runs:
+            self.widget.direct_insert_runs(index_mark, runs)
+
+    def _append_collapsed_block(self, hidden_items, hidden_line_count, tags, index_mark):
+        self._collapsed_block_count += 1
+        block_tag = "_collapsed_%d" % self._collapsed_block_count
+        self._collapsed_block_tags.append(block_tag)
+
+        # the mark (with same name as the tag) will show the place for hidden items
+        self.widget.mark_set(block_tag, index_mark)
+        self.widget.mark_gravity(block_tag, "left")
+        self.widget.direct_insert(index_mark, "[Näita veel %d rida]" % hidden_line_count,
+                                  tags + ("collapsed", block_tag))
+        self.widget.mark_gravity(block_tag, "right")
+        self.widget.tag_bind(block_tag, "<ButtonRelease-1>",
+                             lambda event: self._expand_collapsed_block(block_tag, hidden_items))
+
+    def _expand_collapsed_block(self, block_tag, hidden_items):
+        tag_range = self.widget.tag_ranges(block_tag)
+        if not tag_range:
+            return
+
+        self.widget.direct_delete(tag_range[0], tag_range[1])
+        self.widget.tag_delete(block_tag)
+        self.widget.config(cursor="")
+        # inserted piecewise, as the reason for collapsing was its size
+        self._continue_rendering(hidden_items, 0, block_tag)
+
+    def _create_window(self, kind, attrs, form):
+        if kind == "submit":
+            return self._create_submit_button(attrs, form)
+        elif kind == "file":
+            return self._create_file_input(attrs)
+        else:
+            raise ValueError("Unknown window kind " + kind)
+
+    def _create_submit_button(self, attrs, form):
         def handler():
             self._submit_form(form)
 
         value = attrs.get("value", "Submit")
         btn = ttk.Button(self.widget, text=value, command=handler, width=len(value) + 2)
         btn.html_attrs = attrs
-        self._append_window(btn)
-        if "name" in attrs:
-            form["fields"].append([attrs, value])
+        return btn
 
     def _submit_form(self, form):
         form_data = FormData()
@@ -405,20 +1047,18 @@ class HtmlRenderer(HTMLParser):
             return value_holder.get()
         elif isinstance(value_holder, tk.Text):
             return value_holder.get("1.0", "end")
+        elif isinstance(value_holder, str):
+            # value of a hidden field
+            return value_holder
         else:
             return None
 
-    def _add_hidden_form_variable(self, attrs):
-        self._active_forms[-1]["inputs"].append([attrs, attrs.get("value")])
-
-    def _append_file_input(self, attrs):
+    def _create_file_input(self, attrs):
         # TODO: support also "multiple" flag
-        cb = ttk.Combobox(self.widget, values=["<active editor>", "main.py", "kala.py"])
-        self._append_window(cb)
+        return ttk.Combobox(self.widget, values=["<active editor>", "main.py", "kala.py"])
 
-    def _append_image(self, name, extra_tags=()):
-        assert name is not None
-        index = self.widget.index("mark-1c")
+    def _append_image(self, name, tags, index_mark="mark"):
+        index = self.widget.index(index_mark)
         img_data = self._get_image(name)
         if img_data is None:
             img_data = self._get_image_placeholder()
@@ -427,8 +1067,9 @@ class HtmlRenderer(HTMLParser):
         if name not in self._images_by_name:
             self._images_by_name[name] = []
         self._images_by_name[name].append(img)
+        self._tk_images_by_name[name] = img_data
 
-        for tag in self._get_effective_tags(extra_tags):
+        for tag in tags:
             self.widget.tag_add(tag, index)
 
     def _get_image_placeholder(self):
@@ -444,22 +1085,45 @@ class HtmlRenderer(HTMLParser):
     def _get_image(self, name):
         raise NotImplementedError()
 
-    def _append_window(self, window, extra_tags=()):
-        index = self.widget.index("mark-1c")
+    def _append_window(self, window, tags, index_mark="mark"):
+        index = self.widget.index(index_mark)
         self.widget.window_create(index, window=window)
-        for tag in self._get_effective_tags(extra_tags):
+        for tag in tags:
             self.widget.tag_add(tag, index)
 
-    def _get_effective_tags(self, extra_tags):
-        tags = set(extra_tags) | set(self._context_tags)
-
-        if self._active_lists:
-            tags.add("list%d" % min(len(self._active_lists), 5))
+    def get_image_names(self):
+        return list(self._images_by_name)
+
+    def get_image_distances(self):
+        """Returns distance (in lines) of each image from the visible region, 0 for visible images"""
+        top_line = int(self.widget.index("@0,0").split(".")[0])
+        bottom_line = int(self.widget.index("@0,%d" % self.widget.winfo_height()).split(".")[0])
+        existing_keys = set(self.widget.image_names())
+
+        result = {}
+        for name, keys in self._images_by_name.items():
+            distances = []
+            for key in keys:
+                if key in existing_keys:
+                    line = int(self.widget.index(key).split(".")[0])
+                    distances.append(max(top_line - line, line - bottom_line, 0))
+            if distances:
+                result[name] = min(distances)
 
-        return tuple(sorted(tags))
+        return result
 
     def update_image(self, name, tk_img):
-        for key in self._images_by_name.get(name, []):
+        if name not in self._images_by_name:
+            return
+
+        # images of replaced sections are gone
+        existing_keys = set(self.widget.image_names())
+        self._images_by_name[name] = [key for key in self._images_by_name[name] if key in existing_keys]
+        if self._images_by_name[name]:
+            self._tk_images_by_name[name] = tk_img
+        else:
+            self._tk_images_by_name.pop(name, None)
+        for key in self._images_by_name[name]:
             self.widget.image_configure(key, image=tk_img)
 
 
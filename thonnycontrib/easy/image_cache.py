@@ -0,0 +1,178 @@
+import hashlib
+import json
+import logging
+import os.path
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MEMORY_CACHE_MAX_BYTES = 32 * 1024 * 1024
+DISK_CACHE_MAX_BYTES = 50 * 1024 * 1024
+INDEX_FILE_NAME = "index.json"
+DATA_FILE_SUFFIX = ".img"
+
+
+class MemoryImageCache:
+    """LRU cache of Tk images bounded by the size of their pixel data.
+
+    Supports the dict operations ui.py uses. Must be used in UI thread.
+    """
+
+    def __init__(self, max_bytes=MEMORY_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.eviction_count = 0
+        self._entries = OrderedDict()  # url -> (image, byte count)
+
+    def __contains__(self, url):
+        return url in self._entries
+
+    def __getitem__(self, url):
+        image, _ = self._entries[url]
+        self._entries.move_to_end(url)
+        return image
+
+    def __setitem__(self, url, image):
+        if url in self._entries:
+            self.total_bytes -= self._entries.pop(url)[1]
+
+        byte_count = image.width() * image.height() * 4
+        self._entries[url] = (image, byte_count)
+        self.total_bytes += byte_count
+        self._evict()
+
+    def update(self, images_by_urls):
+        for url, image in images_by_urls.items():
+            self[url] = image
+
+    def _evict(self):
+        evicted_count = 0
+        evicted_bytes = 0
+        # the latest image is kept even if it alone exceeds the limit
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            _, (_, byte_count) = self._entries.popitem(last=False)
+            self.total_bytes -= byte_count
+            evicted_count += 1
+            evicted_bytes += byte_count
+
+        if evicted_count:
+            self.eviction_count += evicted_count
+            logger.info(f"Evicted {evicted_count} images ({evicted_bytes} bytes) from memory cache. "
+                        f"Kept {len(self._entries)} images ({self.total_bytes} bytes), "
+                        f"{self.eviction_count} evictions in total.")
+
+
+class DiskImageCache:
+    """Downscaled image data and HTTP validators (ETag, Last-Modified) bounded by total size.
+
+    Can be used from several threads. Several Thonny processes may share the directory,
+    in the worst case they lose each other's index updates.
+    """
+
+    def __init__(self, directory, max_bytes=DISK_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.eviction_count = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._entries = self._load_index()
+
+    def get(self, url) -> Optional[Tuple[bytes, dict]]:
+        """Returns data and entry info (etag, last_modified, checked)"""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                return None
+
+            try:
+                with open(self._get_data_path(url), "rb") as fp:
+                    data = fp.read()
+            except OSError:
+                del self._entries[url]
+                return None
+
+            entry["used"] = time.time()
+            return data, entry
+
+    def put(self, url, data, etag=None, last_modified=None):
+        path = self._get_data_path(url)
+        with self._lock:
+            self._write_atomically(path, data)
+            now = time.time()
+            self._entries[url] = {
+                "size": len(data),
+                "etag": etag,
+                "last_modified": last_modified,
+                "checked": now,
+                "used": now,
+            }
+            self._evict()
+            self._save_index()
+
+    def mark_checked(self, url):
+        """Records that the cached data was confirmed to be up to date"""
+        with self._lock:
+            if url in self._entries:
+                self._entries[url]["checked"] = time.time()
+                self._save_index()
+
+    def _evict(self):
+        total_bytes = sum(entry["size"] for entry in self._entries.values())
+        evicted_count = 0
+        for url, entry in sorted(self._entries.items(), key=lambda pair: pair[1]["used"]):
+            if total_bytes <= self.max_bytes:
+                break
+
+            total_bytes -= entry["size"]
+            del self._entries[url]
+            evicted_count += 1
+            try:
+                os.remove(self._get_data_path(url))
+            except OSError:
+                pass
+
+        if evicted_count:
+            self.eviction_count += evicted_count
+            logger.info(f"Evicted {evicted_count} images from disk cache. "
+                        f"Kept {len(self._entries)} images ({total_bytes} bytes), "
+                        f"{self.eviction_count} evictions in total.")
+
+    def _get_data_path(self, url):
+        return os.path.join(self.directory, hashlib.sha1(url.encode("utf-8")).hexdigest() + DATA_FILE_SUFFIX)
+
+    def _load_index(self):
+        try:
+            with open(os.path.join(self.directory, INDEX_FILE_NAME), encoding="UTF-8") as fp:
+                entries = json.load(fp)
+        except (OSError, ValueError):
+            entries = {}
+
+        # Remove data files which have fallen out of the index (eg. because of concurrent writes).
+        # Recent files may belong to another process, which hasn't saved its index yet.
+        known_files = {os.path.basename(self._get_data_path(url)) for url in entries}
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if (name.endswith(DATA_FILE_SUFFIX) and name not in known_files
+                    and os.path.getmtime(path) < time.time() - 3600):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+        return entries
+
+    def _save_index(self):
+        try:
+            self._write_atomically(os.path.join(self.directory, INDEX_FILE_NAME),
+                                   json.dumps(self._entries).encode("UTF-8"))
+        except OSError as e:
+            logger.warning(f"Could not save image cache index: '{e}'")
+
+    def _write_atomically(self, path, data):
+        temp_path = "%s.%d.%d.tmp" % (path, os.getpid(), threading.get_ident())
+        with open(temp_path, "wb") as fp:
+            fp.write(data)
+        os.replace(temp_path, path)
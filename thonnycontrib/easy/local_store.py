@@ -0,0 +1,139 @@
+import dataclasses
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple, Any
+
+import easy.data
+
+logger = logging.getLogger(__name__)
+
+# Time (in milliseconds) to wait for other Thonny processes to complete their writes
+BUSY_TIMEOUT_MS = 5000
+# Responses not updated during this period (in seconds) get removed when the store is opened
+MAX_AGE = 60 * 24 * 60 * 60
+NOT_FOUND = object()
+
+
+class LocalStore:
+    """Persists backend responses of the current user in a SQLite database.
+
+    Allows showing pages immediately after login and when the backend can't be reached.
+    Can be used from several threads (each gets its own connection) and several processes (WAL mode).
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._local = threading.local()
+        # Set after authentication. Until then nothing is given out, as the computer may be shared.
+        self._user = None
+        try:
+            with self._get_connection() as conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS responses ("
+                             "user TEXT, endpoint TEXT, args TEXT, type TEXT, value TEXT, saved REAL, "
+                             "PRIMARY KEY (user, endpoint, args))")
+                conn.execute("DELETE FROM responses WHERE saved < ?", (time.time() - MAX_AGE,))
+        except sqlite3.Error as e:
+            logger.warning(f"Could not open local store: '{e}'")
+
+    @property
+    def user(self) -> Optional[str]:
+        return self._user
+
+    def set_user(self, user: Optional[str]):
+        """Responses get stored and given only for this (authenticated) user.
+        None disables the store (eg. after logout)."""
+        self._user = user
+
+    def get(self, key: Tuple) -> Any:
+        """Returns the stored response or NOT_FOUND"""
+        if self._user is None:
+            return NOT_FOUND
+
+        endpoint, args = key[0], json.dumps(key[1:])
+        try:
+            row = self._get_connection().execute(
+                "SELECT type, value FROM responses WHERE user = ? AND endpoint = ? AND args = ?",
+                (self._user, endpoint, args)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not read from local store: '{e}'")
+            return NOT_FOUND
+
+        if row is None:
+            return NOT_FOUND
+
+        return deserialize_response(*row)
+
+    def put(self, key: Tuple, response):
+        if self._user is None:
+            return
+
+        endpoint, args = key[0], json.dumps(key[1:])
+        try:
+            with self._get_connection() as conn:
+                conn.execute("INSERT OR REPLACE INTO responses (user, endpoint, args, type, value, saved) "
+                             "VALUES (?, ?, ?, ?, ?, ?)",
+                             (self._user, endpoint, args, *serialize_response(response), time.time()))
+        except sqlite3.Error as e:
+            logger.warning(f"Could not write to local store: '{e}'")
+
+    def delete(self, endpoint: str, *args):
+        """Removes responses of the endpoint, whose arguments start with given args"""
+        if self._user is None:
+            return
+
+        try:
+            with self._get_connection() as conn:
+                rows = conn.execute("SELECT args FROM responses WHERE user = ? AND endpoint = ?",
+                                    (self._user, endpoint)).fetchall()
+                for (stored_args,) in rows:
+                    if tuple(json.loads(stored_args))[:len(args)] == args:
+                        conn.execute("DELETE FROM responses WHERE user = ? AND endpoint = ? AND args = ?",
+                                     (self._user, endpoint, stored_args))
+        except sqlite3.Error as e:
+            logger.warning(f"Could not delete from local store: '{e}'")
+
+    def clear(self):
+        """Removes responses of the current user"""
+        if self._user is None:
+            return
+
+        try:
+            with self._get_connection() as conn:
+                conn.execute("DELETE FROM responses WHERE user = ?", (self._user,))
+        except sqlite3.Error as e:
+            logger.warning(f"Could not clear local store: '{e}'")
+
+    def _get_connection(self):
+        conn = getattr(self._local, "connection", None)
+        if conn is None:
+            conn = connect(self._path)
+            self._local.connection = conn
+        return conn
+
+
+def connect(path) -> sqlite3.Connection:
+    """Opens a connection suitable for sharing the database with other threads and Thonny processes"""
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA busy_timeout=%d" % BUSY_TIMEOUT_MS)
+    return conn
+
+
+def serialize_response(response) -> Tuple[Optional[str], str]:
+    """Returns type name and JSON of the response (a data class of easy.data or None)"""
+    if response is None:
+        return None, "null"
+
+    fields = {field.name: getattr(response, field.name) for field in dataclasses.fields(response)
+              if field.name not in ("resp_code", "response")}
+    return type(response).__name__, json.dumps(fields, sort_keys=True, default=str)
+
+
+def deserialize_response(type_name: Optional[str], value: str):
+    if type_name is None:
+        return None
+
+    return getattr(easy.data, type_name)(**json.loads(value))
@@ -0,0 +1,128 @@
+import collections
+import logging
+import threading
+import time
+from typing import List
+
+from .scheduler import PREFETCH_LANE
+
+logger = logging.getLogger(__name__)
+
+# At most this many pages get prefetched during BUDGET_PERIOD (in seconds)
+BUDGET = 30
+BUDGET_PERIOD = 10 * 60
+# Same page is not prefetched again during this period (in seconds)
+REFETCH_INTERVAL = 60
+# Navigation to a page prefetched during this period (in seconds) counts as a hit
+HIT_WINDOW = 10 * 60
+STATS_LOGGING_INTERVAL = 20
+
+
+class Prefetcher:
+    """Warms provider's caches (and image cache) for pages the student is likely to open next.
+
+    Tasks run in the prefetch lane, which gets a thread only when more important lanes
+    have nothing queued. Queued tasks get cancelled when the student navigates.
+    """
+
+    def __init__(self, scheduler, provider, load_image):
+        self._scheduler = scheduler
+        self._provider = provider
+        self._load_image = load_image
+        self._lock = threading.Lock()
+        self._prefetch_times = collections.OrderedDict()  # url -> time
+        self._budget_times = collections.deque()
+        self._futures = []
+        self._prefetch_count = 0
+        self._navigation_count = 0
+        self._hit_count = 0
+
+    def prefetch(self, url):
+        """Prefetches the page (eg. because mouse is on the link)"""
+        if self._provider.is_prefetchable(url):
+            self._submit(self._prefetch_page, url)
+
+    def on_page_shown(self, url, recent_urls: List[str]):
+        """Prefetches the pages which usually follow this page and revalidates recently visited pages"""
+        self._submit(self._prefetch_related_pages, url)
+        for recent_url in recent_urls:
+            self.prefetch(recent_url)
+
+    def on_navigation(self, url):
+        # Real navigation takes precedence, prefetches start again when the page is shown
+        for fut in self._futures:
+            fut.cancel()
+        self._futures = []
+
+        with self._lock:
+            self._navigation_count += 1
+            prefetch_time = self._prefetch_times.get(url)
+            if prefetch_time is not None and time.monotonic() - prefetch_time < HIT_WINDOW:
+                self._hit_count += 1
+
+            if self._navigation_count % STATS_LOGGING_INTERVAL == 0:
+                logger.info(f"Prefetch stats: {self._get_stats()}")
+
+    def get_stats(self):
+        with self._lock:
+            return self._get_stats()
+
+    def _get_stats(self):
+        return {"prefetches": self._prefetch_count,
+                "navigations": self._navigation_count,
+                "hits": self._hit_count,
+                "hit_rate": self._hit_count / self._navigation_count if self._navigation_count else 0.0}
+
+    def _submit(self, func, url):
+        self._futures = [fut for fut in self._futures if not fut.done()]
+        self._futures.append(self._scheduler.submit(PREFETCH_LANE, func, url))
+
+    def _take_budget(self, url):
+        with self._lock:
+            now = time.monotonic()
+            while self._budget_times and now - self._budget_times[0] > BUDGET_PERIOD:
+                self._budget_times.popleft()
+
+            prefetch_time = self._prefetch_times.get(url)
+            if prefetch_time is not None and now - prefetch_time < REFETCH_INTERVAL:
+                return False
+            if len(self._budget_times) >= BUDGET:
+                logger.debug(f"Prefetch budget exhausted, skipping {url}")
+                return False
+
+            self._budget_times.append(now)
+            self._prefetch_times[url] = now
+            self._prefetch_times.move_to_end(url)
+            while len(self._prefetch_times) > BUDGET * 2:
+                self._prefetch_times.popitem(last=False)
+            self._prefetch_count += 1
+            return True
+
+    def _prefetch_page(self, url):
+        # Runs in a worker thread
+        if not self._take_budget(url):
+            return
+
+        try:
+            image_urls = self._provider.prefetch(url)
+        except Exception as e:
+            logger.debug(f"Could not prefetch {url}: '{e}'")
+            return
+
+        for image_url in image_urls:
+            try:
+                self._load_image(image_url)
+            except Exception as e:
+                logger.debug(f"Could not prefetch image {image_url}: '{e}'")
+
+    def _prefetch_related_pages(self, url):
+        # Runs in a worker thread
+        try:
+            related_urls = self._provider.get_prefetch_urls(url)
+        except Exception as e:
+            logger.debug(f"Could not find pages to prefetch after {url}: '{e}'")
+            return
+
+        for related_url in related_urls:
+            if self._provider.is_prefetchable(related_url):
+                self._prefetch_page(related_url)
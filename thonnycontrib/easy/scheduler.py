@@ -0,0 +1,178 @@
+import collections
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Optional
+
+# Lanes in the order of priority
+NAVIGATION_LANE = "navigation"
+SUBMISSION_LANE = "submission"
+IMAGE_LANE = "image"
+PREFETCH_LANE = "prefetch"
+LANES = [NAVIGATION_LANE, SUBMISSION_LANE, IMAGE_LANE, PREFETCH_LANE]
+
+
+class TaskScheduler:
+    """Runs tasks in worker threads, like ThreadPoolExecutor, but whenever a thread gets free,
+    it takes the oldest task of the most important lane.
+
+    Lanes can be limited to a number of concurrently running tasks, which keeps threads
+    available for more important work.
+    """
+
+    def __init__(self, max_workers, max_running_by_lanes: Optional[Dict[str, int]] = None):
+        self._max_workers = max_workers
+        self._max_running_by_lanes = dict(max_running_by_lanes or {})
+        self._condition = threading.Condition()
+        self._queues = {lane: collections.deque() for lane in LANES}
+        self._running_counts = {lane: 0 for lane in LANES}
+        self._stats = {lane: _LaneStats() for lane in LANES}
+        self._threads = []
+        self._idle_thread_count = 0
+        self._shutdown = False
+
+    def submit(self, lane, func, *args, replace_key=None) -> Future:
+        """Queues a task to the lane.
+
+        If replace_key is given, a queued (but not started) task of the lane with the same key
+        gets cancelled, ie. a quick series of such requests gets debounced.
+        """
+        future = Future()
+        task = _Task(future, func, args, replace_key)
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new tasks after shutdown")
+
+            queue = self._queues[lane]
+            replaced_tasks = []
+            if replace_key is not None:
+                replaced_tasks = [other for other in queue if other.replace_key == replace_key]
+                for other in replaced_tasks:
+                    queue.remove(other)
+                self._stats[lane].replaced += len(replaced_tasks)
+
+            queue.append(task)
+            self._stats[lane].submitted += 1
+
+            if self._running_counts[lane] >= self._max_running_by_lanes.get(lane, self._max_workers):
+                # the thread of a running task of the lane takes it later
+                pass
+            elif not self._wake_idle_thread() and len(self._threads) < self._max_workers:
+                thread = threading.Thread(target=self._work, daemon=True,
+                                          name="LahendusWorker-%d" % len(self._threads))
+                self._threads.append(thread)
+                thread.start()
+
+        # outside of the lock, as it runs done callbacks
+        for other in replaced_tasks:
+            other.future.cancel()
+
+        return future
+
+    def get_stats(self):
+        """Returns queue depth, running task count and wait times (in seconds) per lane"""
+        with self._condition:
+            return {
+                lane: {
+                    "queued": len([task for task in self._queues[lane] if not task.future.cancelled()]),
+                    "running": self._running_counts[lane],
+                    "submitted": self._stats[lane].submitted,
+                    "replaced": self._stats[lane].replaced,
+                    "started": self._stats[lane].started,
+                    "average_wait": (self._stats[lane].total_wait / self._stats[lane].started
+                                     if self._stats[lane].started else 0.0),
+                    "max_wait": self._stats[lane].max_wait,
+                }
+                for lane in LANES
+            }
+
+    def shutdown(self):
+        """Cancels queued tasks and lets the threads finish after their current task"""
+        with self._condition:
+            self._shutdown = True
+            queued_tasks = [task for queue in self._queues.values() for task in queue]
+            for queue in self._queues.values():
+                queue.clear()
+            self._idle_thread_count = 0
+            self._condition.notify_all()
+
+        for task in queued_tasks:
+            task.future.cancel()
+
+    def _take_task(self):
+        # Must be called with the lock held
+        for lane in LANES:
+            if self._running_counts[lane] >= self._max_running_by_lanes.get(lane, self._max_workers):
+                continue
+
+            queue = self._queues[lane]
+            while queue:
+                task = queue.popleft()
+                if task.future.cancelled():
+                    continue
+
+                wait = time.perf_counter() - task.submitted
+                stats = self._stats[lane]
+                stats.started += 1
+                stats.total_wait += wait
+                stats.max_wait = max(stats.max_wait, wait)
+                self._running_counts[lane] += 1
+                return lane, task
+
+        return None, None
+
+    def _wake_idle_thread(self) -> bool:
+        # Must be called with the lock held.
+        # The idle count gets lowered here and not by the woken thread, otherwise a burst of tasks
+        # would be given to the same thread, while it's still waiting for the lock.
+        if self._idle_thread_count == 0:
+            return False
+
+        self._idle_thread_count -= 1
+        self._condition.notify()
+        return True
+
+    def _work(self):
+        while True:
+            with self._condition:
+                lane, task = self._take_task()
+                while task is None:
+                    if self._shutdown:
+                        return
+                    self._idle_thread_count += 1
+                    self._condition.wait()
+                    lane, task = self._take_task()
+
+            try:
+                # False if got cancelled after it was taken
+                if task.future.set_running_or_notify_cancel():
+                    try:
+                        result = task.func(*task.args)
+                    except BaseException as e:
+                        task.future.set_exception(e)
+                    else:
+                        task.future.set_result(result)
+            finally:
+                with self._condition:
+                    self._running_counts[lane] -= 1
+                    # a task of a limited lane may be waiting for this
+                    if any(self._queues.values()):
+                        self._wake_idle_thread()
+
+
+class _Task:
+    def __init__(self, future, func, args, replace_key):
+        self.future = future
+        self.func = func
+        self.args = args
+        self.replace_key = replace_key
+        self.submitted = time.perf_counter()
+
+
+class _LaneStats:
+    def __init__(self):
+        self.submitted = 0
+        self.replaced = 0
+        self.started = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
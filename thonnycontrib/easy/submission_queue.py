@@ -0,0 +1,262 @@
+import logging
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Optional, Dict
+
+from easy import AuthRequiredException, ErrorResponseException
+
+from .local_store import connect
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+# Queued, but not attempted again before login
+WAITING_FOR_AUTH = "waiting_for_auth"
+SENDING = "sending"
+ACCEPTED = "accepted"
+FAILED = "failed"
+
+# Delays (in seconds) between attempts grow from the first to the max delay
+FIRST_RETRY_DELAY = 2
+MAX_RETRY_DELAY = 5 * 60
+MAX_ATTEMPTS = 10
+# Submission left in SENDING state for this long (in seconds) belongs to a crashed process
+SENDING_TIMEOUT = 5 * 60
+# For this long (in seconds) the page says that the submission was accepted
+ACCEPTED_DISPLAY_TIME = 60
+# Completed submissions are forgotten after this time (in seconds)
+MAX_AGE = 24 * 60 * 60
+
+
+class SubmissionQueue:
+    """Keeps submissions in a database until the backend has accepted them.
+
+    Submissions are sent in a background thread, with growing delays between attempts.
+    Several Thonny processes can share the queue, each submission is sent by one of them.
+
+    As the backend can't tell whether a submission with unknown outcome (eg. timeout) was accepted,
+    before retrying it the latest submission of the exercise gets checked.
+    """
+
+    def __init__(self, path,
+                 post_submission: Callable[[str, str, str], None],
+                 get_latest_submission: Callable[[str, str], Optional[object]],
+                 get_user: Callable[[], Optional[str]],
+                 on_change: Callable[[str, str, str], None]):
+        self._path = path
+        self._post_submission = post_submission
+        self._get_latest_submission = get_latest_submission
+        self._get_user = get_user
+        self._on_change = on_change
+        self._local = threading.local()
+        self._wake_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._suspended = False
+
+        try:
+            with self._get_connection() as conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS submissions ("
+                             "id TEXT PRIMARY KEY, user TEXT, course_id TEXT, exercise_id TEXT, solution TEXT, "
+                             "state TEXT, attempts INTEGER, previous_id TEXT, uncertain INTEGER, "
+                             "created REAL, updated REAL, next_attempt REAL, error TEXT)")
+                now = time.time()
+                conn.execute("DELETE FROM submissions WHERE state IN (?, ?) AND updated < ?",
+                             (ACCEPTED, FAILED, now - MAX_AGE))
+        except sqlite3.Error as e:
+            logger.warning(f"Could not open submission queue: '{e}'")
+
+    def add(self, course_id: str, exercise_id: str, solution: str):
+        """Queues the submission and wakes up the sender"""
+        user = self._get_user()
+        now = time.time()
+        with self._get_connection() as conn:
+            # Repeated clicks don't create new submissions. Older unsent solutions are not needed.
+            conn.execute("DELETE FROM submissions WHERE user IS ? AND course_id = ? AND exercise_id = ? "
+                         "AND state IN (?, ?) AND solution != ?",
+                         (user, course_id, exercise_id, QUEUED, WAITING_FOR_AUTH, solution))
+            duplicate = conn.execute("SELECT id FROM submissions WHERE user IS ? AND course_id = ? AND exercise_id = ? "
+                                     "AND state IN (?, ?, ?) AND solution = ?",
+                                     (user, course_id, exercise_id, QUEUED, WAITING_FOR_AUTH, SENDING,
+                                      solution)).fetchone()
+            if duplicate is None:
+                conn.execute("INSERT INTO submissions (id, user, course_id, exercise_id, solution, state, attempts, "
+                             "uncertain, created, updated, next_attempt) VALUES (?, ?, ?, ?, ?, ?, 0, 0, ?, ?, ?)",
+                             (uuid.uuid4().hex, user, course_id, exercise_id, solution, QUEUED, now, now, now))
+            else:
+                logger.info(f"Same solution to exercise {exercise_id} is already in the queue")
+
+        self.wake_up()
+
+    def get_state(self, course_id: str, exercise_id: str) -> Optional[Dict]:
+        """Returns state, attempts and error of the last submission of the exercise,
+        if it is still interesting for the student"""
+        try:
+            row = self._get_connection().execute(
+                "SELECT state, attempts, error, updated FROM submissions "
+                "WHERE user IS ? AND course_id = ? AND exercise_id = ? ORDER BY created DESC LIMIT 1",
+                (self._get_user(), course_id, exercise_id)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not read submission queue: '{e}'")
+            return None
+
+        if row is None:
+            return None
+
+        state, attempts, error, updated = row
+        if state == ACCEPTED and time.time() - updated > ACCEPTED_DISPLAY_TIME:
+            return None
+        return {"state": state, "attempts": attempts, "error": error}
+
+    def resume_after_login(self):
+        """Sends submissions which were waiting for authentication without further delay"""
+        try:
+            with self._get_connection() as conn:
+                conn.execute("UPDATE submissions SET state = ?, next_attempt = ? WHERE user IS ? AND state = ?",
+                             (QUEUED, time.time(), self._get_user(), WAITING_FOR_AUTH))
+        except sqlite3.Error as e:
+            logger.warning(f"Could not resume submission queue: '{e}'")
+
+        self.wake_up()
+
+    def suspend(self):
+        """Stops sending after the current attempt, until resume"""
+        self._suspended = True
+
+    def resume(self):
+        self._suspended = False
+        self.wake_up()
+
+    def wake_up(self):
+        """Starts the sender or makes it check the queue now"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._work, daemon=True, name="LahendusSubmissionSender")
+                self._thread.start()
+        self._wake_event.set()
+
+    def _work(self):
+        while True:
+            self._wake_event.clear()
+            if self._suspended:
+                self._wake_event.wait()
+                continue
+
+            try:
+                delay = self._send_due_submissions()
+            except Exception:
+                logger.exception("Unexpected error in submission sender")
+                delay = MAX_RETRY_DELAY
+            self._wake_event.wait(delay)
+
+    def _send_due_submissions(self) -> Optional[float]:
+        """Returns time (in seconds) until next attempt, or None if queue is empty"""
+        while True:
+            user = self._get_user()
+            now = time.time()
+            with self._get_connection() as conn:
+                conn.execute("UPDATE submissions SET state = ?, uncertain = 1 WHERE state = ? AND updated < ?",
+                             (QUEUED, SENDING, now - SENDING_TIMEOUT))
+                row = conn.execute("SELECT id, course_id, exercise_id, solution, attempts, previous_id, uncertain, "
+                                   "next_attempt FROM submissions WHERE user IS ? AND state = ? "
+                                   "ORDER BY next_attempt LIMIT 1", (user, QUEUED)).fetchone()
+            if row is None:
+                return None
+
+            submission_id, course_id, exercise_id, solution, attempts, previous_id, uncertain, next_attempt = row
+            if next_attempt > now:
+                return next_attempt - now
+
+            if not self._claim(submission_id):
+                # another process took it
+                continue
+
+            self._notify(course_id, exercise_id, SENDING)
+            self._send(submission_id, course_id, exercise_id, solution, attempts, previous_id, uncertain)
+
+    def _claim(self, submission_id) -> bool:
+        with self._get_connection() as conn:
+            cursor = conn.execute("UPDATE submissions SET state = ?, updated = ? WHERE id = ? AND state = ?",
+                                  (SENDING, time.time(), submission_id, QUEUED))
+            return cursor.rowcount == 1
+
+    def _send(self, submission_id, course_id, exercise_id, solution, attempts, previous_id, uncertain):
+        try:
+            if uncertain and self._is_accepted(course_id, exercise_id, solution, previous_id):
+                logger.info(f"Submission to exercise {exercise_id} turned out to be accepted before")
+                self._set_state(submission_id, ACCEPTED, error=None)
+                self._notify(course_id, exercise_id, ACCEPTED)
+                return
+
+            if previous_id is None:
+                latest = self._get_latest_submission(course_id, exercise_id)
+                previous_id = "" if latest is None else latest.id
+                self._set_state(submission_id, SENDING, previous_id=previous_id)
+
+            logger.info(f"Sending submission to exercise {exercise_id} (attempt {attempts + 1})")
+            self._post_submission(course_id, exercise_id, solution)
+
+        except AuthRequiredException:
+            # Sending continues after login
+            logger.info(f"Submission to exercise {exercise_id} waits for authentication")
+            self._set_state(submission_id, WAITING_FOR_AUTH)
+            self._notify(course_id, exercise_id, WAITING_FOR_AUTH)
+
+        except Exception as e:
+            transient = _is_transient(e)
+            attempts += 1
+            if transient and attempts < MAX_ATTEMPTS:
+                delay = min(FIRST_RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY) * random.uniform(1, 1.5)
+                logger.info(f"Could not send submission to exercise {exercise_id}: '{e}'. "
+                            f"Retrying in {delay:.0f} seconds.")
+                # The backend may have got the submission even if the response was lost
+                self._set_state(submission_id, QUEUED, attempts=attempts, uncertain=1,
+                                next_attempt=time.time() + delay, error=str(e))
+                self._notify(course_id, exercise_id, QUEUED)
+            else:
+                logger.warning(f"Submission to exercise {exercise_id} failed: '{e}'")
+                self._set_state(submission_id, FAILED, attempts=attempts, error=str(e))
+                self._notify(course_id, exercise_id, FAILED)
+
+        else:
+            logger.info(f"Submission to exercise {exercise_id} was accepted")
+            self._set_state(submission_id, ACCEPTED, attempts=attempts + 1, error=None)
+            self._notify(course_id, exercise_id, ACCEPTED)
+
+    def _is_accepted(self, course_id, exercise_id, solution, previous_id) -> bool:
+        if previous_id is None:
+            # Didn't get as far as sending
+            return False
+
+        latest = self._get_latest_submission(course_id, exercise_id)
+        return latest is not None and latest.id != previous_id and latest.solution == solution
+
+    def _set_state(self, submission_id, state, **fields):
+        fields["state"] = state
+        fields["updated"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._get_connection() as conn:
+            conn.execute(f"UPDATE submissions SET {assignments} WHERE id = ?", (*fields.values(), submission_id))
+
+    def _notify(self, course_id, exercise_id, state):
+        try:
+            self._on_change(course_id, exercise_id, state)
+        except Exception:
+            logger.exception("Error in submission state handler")
+
+    def _get_connection(self):
+        conn = getattr(self._local, "connection", None)
+        if conn is None:
+            conn = connect(self._path)
+            self._local.connection = conn
+        return conn
+
+
+def _is_transient(e: Exception) -> bool:
+    if isinstance(e, ErrorResponseException):
+        return e.resp is None or e.resp.status_code >= 500 or e.resp.status_code == 429
+    # eg. connection error or timeout
+    return isinstance(e, OSError)
@@ -1,9 +1,10 @@
 import os
-from typing import Dict
+from typing import Dict, Optional
 
 import chevron
-from easy import SubmissionResp
+from easy import SubmissionResp, ExerciseDetailsResp, AutogradeStatus
 
+from thonnycontrib.easy.submission_queue import QUEUED, WAITING_FOR_AUTH, SENDING, ACCEPTED, FAILED
 from thonnycontrib.easy.ui import EDITOR_CONTENT_NAME
 
 
@@ -38,16 +39,17 @@ def generate_role_not_allowed_html():
     return "<div>Sul puudub õpilase roll, mis on vajalik plugina kasutamiseks.</div>"
 
 
-def generate_login_html(from_url) -> str:
-    return render("authenticate.mustache", {"from_url": "/" if from_url is None else from_url})
+def generate_login_html(from_url, failed=False) -> str:
+    return render("authenticate.mustache", {"from_url": "/" if from_url is None else from_url, "failed": failed})
 
 
-def generate_error_html(error_msg) -> str:
-    return f"<h1>Viga!</h1><div>{error_msg}</div>"
+def generate_auth_waiting_html(starting) -> str:
+    state = "Avan veebilehitsejat..." if starting else "Ootan veebilehitsejas sisselogimist..."
+    return f"""<h1>LAHENDUS</h1><div><em>{state}</em></div><br/><a href="/auth/cancel">Katkesta</a>"""
 
 
-def generate_error_auth() -> str:
-    return f"""<h1>Autentimine ebaõnnestus!</h1><a href="/auth">Alusta autentimist uuesti</a>"""
+def generate_error_html(error_msg) -> str:
+    return f"<h1>Viga!</h1><div>{error_msg}</div>"
 
 
 def _convert_to_str(value):
@@ -57,24 +59,40 @@ def _convert_to_str(value):
         return str(value)
 
 
-def generate_exercise_html(provider, course_id, exercise_id) -> str:
-    def has_submissions() -> bool:
-        return len(provider.easy.student.get_all_submissions(course_id, exercise_id).submissions) > 0
-
-    if has_submissions():
-        latest = provider.easy.student.get_latest_exercise_submission_details(course_id, exercise_id)
-    else:
-        latest = SubmissionResp()
-
-    details = provider.easy.student.get_exercise_details(course_id, exercise_id)
+def generate_exercise_html(details: ExerciseDetailsResp, latest: SubmissionResp, queued_submission: Optional[Dict],
+                           course_id, exercise_id, provider_url) -> str:
+    queue_state = None if queued_submission is None else queued_submission["state"]
     return render("exercise.mustache", {"effective_title": details.effective_title,
+                                        "submission_queued": queue_state in (QUEUED, WAITING_FOR_AUTH),
+                                        "submission_waiting_for_auth": queue_state == WAITING_FOR_AUTH,
+                                        "submission_sending": queue_state == SENDING,
+                                        "submission_accepted": queue_state == ACCEPTED,
+                                        "submission_failed": queue_state == FAILED,
+                                        "submission_error": None if queued_submission is None
+                                        else queued_submission["error"],
                                         "text_html": details.text_html,
                                         "grade_auto": _convert_to_str(latest.grade_auto),
                                         "feedback_auto": latest.feedback_auto,
+                                        "grading_in_progress": is_grading_in_progress(latest),
                                         "solution": latest.solution,
                                         "EDITOR_CONTENT_NAME": EDITOR_CONTENT_NAME,
                                         "course_id": course_id,
                                         "exercise_id": exercise_id,
                                         "latest_feedback_teacher": latest.feedback_teacher,
                                         "latest_grade_teacher": _convert_to_str(latest.grade_teacher),
-                                        "provider_url": provider.easy.util.idp_client_name})
+                                        "provider_url": provider_url})
+
+
+def is_grading_in_progress(submission: SubmissionResp) -> bool:
+    return submission.autograde_status in (AutogradeStatus.IN_PROGRESS, AutogradeStatus.IN_PROGRESS.value)
+
+
+def generate_submission_list_html(submissions, has_more, next_limit, course_id, exercise_id) -> str:
+    return render("submissions.mustache", {"submissions": [{"submission_time": s["submission_time"],
+                                                            "grade_auto": _convert_to_str(s["grade_auto"]),
+                                                            "grade_teacher": _convert_to_str(s["grade_teacher"]),
+                                                            "solution": s["solution"]} for s in submissions],
+                                           "has_more": has_more,
+                                           "next_limit": next_limit,
+                                           "course_id": course_id,
+                                           "exercise_id": exercise_id})
@@ -0,0 +1,135 @@
+import logging
+import threading
+import time
+
+from easy import decode_token, TokenType
+
+logger = logging.getLogger(__name__)
+
+# Access token gets renewed this long (in seconds) before it expires (or sooner for short-lived tokens)
+REFRESH_MARGIN = 60
+# Delays (in seconds) between failed attempts grow from the first to the max delay
+FIRST_RETRY_DELAY = 10
+MAX_RETRY_DELAY = 60
+# Protects identity provider from a refresh loop, if tokens turn out to be very short-lived
+MIN_REFRESH_INTERVAL = 10
+
+
+class TokenRefresher:
+    """Renews the access token in the background before it expires,
+    so that requests don't need to wait for the identity provider.
+
+    Tokens are kept in the RequestUtil, which is shared by all threads. Refreshing is serialized,
+    so that a request, which still finds an expired token, doesn't refresh again what was just refreshed.
+    """
+
+    def __init__(self, request_util):
+        self._util = request_util
+        self._lock = threading.Lock()
+        self._wake_event = threading.Event()
+        self._stopped = False
+        self._suspended = False
+        # easy-py has no public way to refresh, so its private method is replaced (tested with easy-py 0.3)
+        if not hasattr(request_util, "_refresh_using_refresh_token"):
+            logger.warning("This version of easy-py doesn't allow refreshing tokens in the background, "
+                           "they get refreshed on demand")
+            self._original_refresh = None
+            return
+        self._original_refresh = request_util._refresh_using_refresh_token
+        # Lazy refreshing (in get_valid_access_token) goes through the lock as well
+        request_util._refresh_using_refresh_token = self._refresh_if_needed
+
+    def start(self):
+        if self._original_refresh is None:
+            return
+        threading.Thread(target=self._work, daemon=True, name="LahendusTokenRefresher").start()
+
+    def wake_up(self):
+        """Makes the refresher to check the tokens again (eg. after login)"""
+        self._wake_event.set()
+
+    def suspend(self):
+        """Stops refreshing in advance, tokens still get refreshed when a request needs it"""
+        self._suspended = True
+
+    def resume(self):
+        self._suspended = False
+        self._wake_event.set()
+
+    def stop(self):
+        self._stopped = True
+        self._wake_event.set()
+
+    def _work(self):
+        retry_delay = FIRST_RETRY_DELAY
+        last_refresh_time = 0
+        while not self._stopped:
+            self._wake_event.clear()
+            if self._suspended:
+                self._wake_event.wait()
+                continue
+
+            token = self._util.get_stored_token(TokenType.ACCESS)
+            if token is None:
+                # not logged in
+                self._wake_event.wait()
+                continue
+
+            delay = max(self._get_refresh_time(token), last_refresh_time + MIN_REFRESH_INTERVAL) - time.time()
+            if delay > 0:
+                self._wake_event.wait(delay)
+                continue
+
+            last_refresh_time = time.time()
+            try:
+                refreshed = self._refresh(token)
+            except Exception as e:
+                # eg. offline. Requests will fail with the same error until the network is back.
+                logger.info(f"Could not refresh access token: '{e}'. Retrying in {retry_delay} seconds.")
+                self._wake_event.wait(retry_delay)
+                retry_delay = min(retry_delay * 2, MAX_RETRY_DELAY)
+                continue
+
+            retry_delay = FIRST_RETRY_DELAY
+            if not refreshed:
+                # Refresh token has expired or was revoked. Next request gets AuthRequiredException.
+                logger.info("Refresh token was not accepted, waiting for login")
+                self._wake_event.wait()
+
+    def _get_refresh_time(self, token) -> float:
+        try:
+            claims = decode_token(token.token)
+            expires_at = claims["exp"]
+            lifetime = expires_at - claims.get("iat", expires_at - 4 * REFRESH_MARGIN)
+        except (ValueError, KeyError, IndexError) as e:
+            logger.warning(f"Could not decode access token: '{e}'")
+            expires_at = token.expires_at
+            lifetime = 4 * REFRESH_MARGIN
+
+        # The client considers token invalid a bit before its expiry
+        return expires_at - self._util.auth_token_min_valid_sec - min(REFRESH_MARGIN, lifetime / 4)
+
+    def _refresh(self, old_token) -> bool:
+        with self._lock:
+            current_token = self._util.get_stored_token(TokenType.ACCESS)
+            if current_token is not None and current_token.token != old_token.token:
+                # got refreshed meanwhile
+                return True
+
+            start_time = time.perf_counter()
+            result = self._original_refresh()
+            logger.info(f"Refreshed access token in the background in "
+                        f"{(time.perf_counter() - start_time) * 1000:.0f} ms, result: {result}")
+            return result
+
+    def _refresh_if_needed(self) -> bool:
+        # Called by RequestUtil in the thread of a request
+        with self._lock:
+            if self._util.access_token_is_valid(self._util.get_stored_token(TokenType.ACCESS)):
+                return True
+
+            logger.info("Refreshing access token on demand")
+            result = self._original_refresh()
+
+        self._wake_event.set()
+        return result
@@ -0,0 +1,83 @@
+import json
+import logging
+import os.path
+import threading
+import time
+from typing import Optional
+
+from easy import decode_token, TokenType
+
+logger = logging.getLogger(__name__)
+
+
+class TokenStore:
+    """Keeps the tokens of Ez client in files, so that the login survives Thonny restarts.
+
+    Files are readable only by their owner. Tokens are kept also in memory, as they are read
+    for each request. Can be used from several threads.
+    """
+
+    def __init__(self, directory):
+        self._directory = directory
+        self._lock = threading.Lock()
+        self._tokens = {}  # TokenType -> token dict or None
+
+    def retrieve(self, token_type: TokenType) -> Optional[dict]:
+        with self._lock:
+            if token_type not in self._tokens:
+                self._tokens[token_type] = self._load(token_type)
+            return self._tokens[token_type]
+
+    def persist(self, token_type: TokenType, token: dict):
+        with self._lock:
+            self._tokens[token_type] = token
+
+        path = self._get_path(token_type)
+        temp_path = "%s.%d.tmp" % (path, os.getpid())
+        try:
+            with open(os.open(temp_path, os.O_CREAT | os.O_WRONLY | os.O_TRUNC, 0o600), "w", encoding="UTF-8") as fp:
+                json.dump(token, fp)
+            os.replace(temp_path, path)
+        except OSError as e:
+            # The login lasts until Thonny gets closed
+            logger.warning(f"Could not save {token_type.value}: '{e}'")
+
+    def clear(self):
+        with self._lock:
+            self._tokens = {token_type: None for token_type in TokenType}
+
+        for token_type in TokenType:
+            try:
+                os.remove(self._get_path(token_type))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not remove {token_type.value}: '{e}'")
+
+    def get_user(self) -> Optional[str]:
+        """Returns id of the student the tokens belong to, unless the login has expired"""
+        refresh_token = self.retrieve(TokenType.REFRESH)
+        access_token = self.retrieve(TokenType.ACCESS)
+        if refresh_token is None or access_token is None or refresh_token["expires_at"] <= time.time():
+            return None
+
+        try:
+            claims = decode_token(access_token["token"])
+        except (ValueError, KeyError, IndexError) as e:
+            logger.warning(f"Could not decode access token: '{e}'")
+            return None
+
+        return claims.get("sub") or claims.get("preferred_username")
+
+    def _load(self, token_type):
+        try:
+            with open(self._get_path(token_type), encoding="UTF-8") as fp:
+                return json.load(fp)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read {token_type.value}: '{e}'")
+            return None
+
+    def _get_path(self, token_type):
+        return os.path.join(self._directory, token_type.value + ".json")
@@ -1,32 +1,95 @@
+import collections
 import concurrent.futures
+import logging
+import os.path
 import platform
+import queue
+import time
 import tkinter as tk
 import traceback
 from io import BytesIO
 from tkinter import ttk, messagebox
 from typing import Tuple, List, Optional, Callable, Union
-from urllib.request import urlopen
 
-from thonny import tktextext, get_workbench
+from thonny import tktextext, get_workbench, THONNY_USER_DIR
 from thonny.ui_utils import scrollbar_style, lookup_style_option
 
-from .htmltext import FormData, HtmlText, HtmlRenderer
+from .htmltext import FormData, HtmlText, HtmlRenderer, parse_html, DEFAULT_MAX_BLOCK_LINES, DisplayList
+from .image_cache import MemoryImageCache, DiskImageCache
+from .prefetch import Prefetcher
+from .scheduler import TaskScheduler, NAVIGATION_LANE, SUBMISSION_LANE, IMAGE_LANE, PREFETCH_LANE
 
-EDITOR_CONTENT_NAME = "$EDITOR_CONTENT"
+logger = logging.getLogger(__name__)
 
-_images_by_urls = {}
+EDITOR_CONTENT_NAME = "$EDITOR_CONTENT"
+MAX_BLOCK_LINES_OPTION = "lahendus.max_block_lines"
+PREFETCH_OPTION = "lahendus.prefetch"
+MAX_HISTORY_LENGTH = 50
+MAX_HISTORY_SNAPSHOTS = 10
+IMAGE_WIDTH = 250
+# Time (in seconds) the UI thread may spend on converting decoded images per event loop iteration
+IMAGE_CONVERSION_SLICE_DURATION = 0.015
+# Virtual event, which wakes up UI thread when a worker has completed a task
+WORKER_DONE_EVENT = "<<LahendusWorkerDone>>"
+PAGE_TASK = "page"
+IMAGE_TASK = "image"
+REVALIDATE_TASK = "revalidate"
+NAVIGATE_TASK = "navigate"
+# Time (in seconds) mouse must stay on a link before its page gets prefetched
+LINK_HOVER_DELAY = 0.15
+# Number of recently visited pages revalidated by prefetcher
+MAX_RECENT_PREFETCHES = 3
+# Time (in seconds) the view may be hidden before its background activity gets suspended
+SUSPEND_DELAY = 5 * 60
+# Time (in seconds) after which an image in disk cache is checked for changes
+IMAGE_REVALIDATION_INTERVAL = 24 * 60 * 60
+
+_images_by_urls = MemoryImageCache()
+_disk_image_cache = None  # type: Optional[DiskImageCache]
+
+
+def _get_disk_image_cache():
+    global _disk_image_cache
+    if _disk_image_cache is None:
+        _disk_image_cache = DiskImageCache(os.path.join(THONNY_USER_DIR, "lahendus", "images"))
+    return _disk_image_cache
 
 
 class ExercisesView(ttk.Frame):
     def __init__(self, master, exercise_provider_class):
         self._destroyed = False
-        self._poll_scheduler = None
+        self._image_conversion_scheduler = None
         super().__init__(master, borderwidth=0, relief="flat")
-
-        self._provider = exercise_provider_class(self)
-        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self._provider.get_max_threads())
+        get_workbench().set_default(MAX_BLOCK_LINES_OPTION, DEFAULT_MAX_BLOCK_LINES)
+        get_workbench().set_default(PREFETCH_OPTION, False)
+
+        # Provider and scheduler get created when the view is first shown
+        self._provider_class = exercise_provider_class
+        self._provider = None  # type: Optional[ExerciseProvider]
+        self._scheduler = None  # type: Optional[TaskScheduler]
+        self._prefetcher = None  # type: Optional[Prefetcher]
+        self._link_hover_scheduler = None
+        self._suspended = False
+        self._suspend_scheduler = None
         self._page_future = None  # type: Optional[concurrent.futures.Future]
+        # Change notifications which arrived while a page was loading
+        self._revalidation_pending = False
+        self._pending_revalidation_url = None
+        # Incremented with each page request. Results of earlier requests are dropped.
+        self._page_generation = 0
+        self._page_request = None  # type: Optional[Tuple[str, bool]]
+        self._page_update_in_place = False
         self._image_futures = {}
+        # (kind, key, future) triples put by worker threads
+        self._completed_futures = queue.Queue()
+        self._ready_images = collections.deque()  # (url, future) pairs
+        self._pending_image_urls = []
+        self._image_loads_scheduled = False
+        self._max_image_loads = None  # type: Optional[int]
+        self._history = []  # type: List[HistoryEntry]
+        self._history_index = -1
+        # None if what's shown is not a provider page (eg. waiting message or error)
+        self._shown_page = None  # type: Optional[Tuple[DisplayList, List[Tuple[str, str]]]]
 
         self.columnconfigure(0, weight=1)
         self.rowconfigure(1, weight=1)
@@ -52,6 +115,7 @@ class ExercisesView(ttk.Frame):
             renderer_class=ExerciseHtmlRenderer,
             link_and_form_handler=self._on_request_new_page,
             image_requester=self._on_request_image,
+            link_hover_handler=self._on_link_hover,
             read_only=True,
             wrap="word",
             font="TkDefaultFont",
@@ -65,51 +129,176 @@ class ExercisesView(ttk.Frame):
         )
 
         self._html_widget.grid(row=1, column=0, sticky="nsew")
+        for widget in [self._html_widget, self.breadcrumbs_bar]:
+            widget.bind("<Alt-Left>", lambda event: self.go_back(), True)
+            widget.bind("<Alt-Right>", lambda event: self.go_forward(), True)
 
         self.vert_scrollbar["command"] = self._html_widget.yview
         self.hor_scrollbar["command"] = self._html_widget.xview
 
-        self._poll_scheduler = None
+        self.bind(WORKER_DONE_EVENT, self._process_completed_futures, True)
+        self.bind("<Map>", self._on_map, True)
+        self.bind("<Unmap>", self._on_unmap, True)
+
+    def _on_map(self, event=None):
+        if self._suspend_scheduler is not None:
+            self.after_cancel(self._suspend_scheduler)
+            self._suspend_scheduler = None
+
+        if self._provider is None:
+            self._activate()
+        elif self._suspended:
+            self._resume()
+
+    def _on_unmap(self, event=None):
+        if self._provider is not None and not self._suspended and self._suspend_scheduler is None:
+            self._suspend_scheduler = self.after(SUSPEND_DELAY * 1000, self._suspend)
+
+    def _activate(self):
+        # Done only when the view gets shown, so that hidden view doesn't slow down Thonny's startup
+        self._provider = self._provider_class(self)
+        # leave threads for page requests
+        self._max_image_loads = max(self._provider.get_max_threads() // 2, 1)
+        self._scheduler = TaskScheduler(self._provider.get_max_threads(),
+                                        {IMAGE_LANE: self._max_image_loads, PREFETCH_LANE: 1})
+        if get_workbench().get_option(PREFETCH_OPTION):
+            self._prefetcher = Prefetcher(self._scheduler, self._provider, self._load_image)
 
         # TODO: go to last page from previous session?
         self.go_to("/")
-        self._poll_provider_responses()
 
-    def _poll_provider_responses(self):
+    def _suspend(self):
+        logger.info("Suspending background activity of hidden view")
+        self._suspend_scheduler = None
+        self._suspended = True
+        self._provider.suspend()
+
+    def _resume(self):
+        logger.info("Resuming background activity")
+        self._suspended = False
+        self._provider.resume()
+        self._start_image_loads()
+
+        # Data may have changed meanwhile
+        self._revalidate_shown_page()
+
+    def notify_content_changed(self, url=None):
+        """Provider calls this (from any thread), when data of the page (or any page) may have changed"""
+        self._on_future_done(REVALIDATE_TASK, url, None)
+
+    def notify_navigation(self, url):
+        """Provider calls this (from any thread) to show another page, eg. after completing authentication"""
+        self._on_future_done(NAVIGATE_TASK, url, None)
+
+    def _revalidate_shown_page(self, url=None):
+        if self._page_future is not None:
+            # The page being loaded may have used older data. Revalidate when it's shown.
+            if self._revalidation_pending and self._pending_revalidation_url != url:
+                url = None
+            self._revalidation_pending = True
+            self._pending_revalidation_url = url
+            return
+
+        if self._shown_page is not None and self._history_index >= 0:
+            entry = self._history[self._history_index]
+            if entry.revisitable and url in (None, entry.url):
+                self._request_page(entry.url, FormData(), True)
+
+    def _submit(self, lane, kind, key, func, *args, replace_key=None):
+        """Runs func in a worker thread. Result gets handled in UI thread as soon as it's ready."""
+        fut = self._scheduler.submit(lane, func, *args, replace_key=replace_key)
+        fut.add_done_callback(lambda f: self._on_future_done(kind, key, f))
+        return fut
+
+    def _on_future_done(self, kind, key, fut):
+        # Runs in a worker thread (or in UI thread, if the future got cancelled)
+        self._completed_futures.put((kind, key, fut))
         if self._destroyed:
             return
 
-        if self._page_future is not None and self._page_future.done():
-            # Cancelled futures won't make it here
-            assert not self._page_future.cancelled()
+        try:
+            # Tk queues the event for the UI thread
+            self.event_generate(WORKER_DONE_EVENT, when="tail")
+        except (tk.TclError, RuntimeError):
+            # the view or the main loop is gone
+            pass
 
-            exc = self._page_future.exception()
-            if exc is not None:
-                self._set_page_html("<pre>%s</pre>" %
-                                    "".join(traceback.format_exception(type(exc), exc, exc.__traceback__))
-                                    )
-            else:
-                html, breadcrumbs = self._page_future.result()
-                self._set_page_html(html)
-                self.breadcrumbs_bar.set_links(breadcrumbs)
-
-            self._page_future = None
-
-        remaining_img_futures = {}
-        for url, fut in self._image_futures.items():
-            if fut.done():
-                try:
-                    data = fut.result()
-                except:
-                    traceback.print_exc()
-                else:
-                    self._update_image(url, fut.result())
+    def _process_completed_futures(self, event=None):
+        if self._destroyed:
+            return
 
+        while True:
+            try:
+                kind, key, fut = self._completed_futures.get_nowait()
+            except queue.Empty:
+                break
+
+            if kind == REVALIDATE_TASK:
+                if not self._suspended:
+                    self._revalidate_shown_page(key)
+                continue
+            elif kind == NAVIGATE_TASK:
+                self._navigate_on_request(key)
+                continue
+
+            if fut.cancelled():
+                continue
+
+            if kind == PAGE_TASK:
+                # the request may have been superseded while it was running
+                if key == self._page_generation:
+                    self._show_page_result(fut)
+            elif kind == IMAGE_TASK:
+                # results of dropped requests are still useful for cache
+                if self._image_futures.get(key) is fut:
+                    del self._image_futures[key]
+                self._ready_images.append((key, fut))
+
+        self._convert_ready_images()
+        self._start_image_loads()
+
+    def _show_page_result(self, fut):
+        self._html_widget.config(cursor="")
+        exc = fut.exception()
+        if exc is not None:
+            self._set_page_html("<pre>%s</pre>" %
+                                "".join(traceback.format_exception(type(exc), exc, exc.__traceback__))
+                                )
+        else:
+            display_list, breadcrumbs = fut.result()
+            if self._page_update_in_place:
+                # does nothing if content hasn't changed
+                self._html_widget.update_display_list(display_list)
             else:
-                remaining_img_futures[url] = fut
-        self._image_futures = remaining_img_futures
+                self._html_widget.set_display_list(display_list, progressive=True)
+                self._drop_unneeded_image_requests()
+            self.breadcrumbs_bar.set_links(breadcrumbs)
+            self._shown_page = (display_list, breadcrumbs)
+            self._start_prefetching()
+
+        self._page_future = None
+        self._page_request = None
+
+        if self._revalidation_pending:
+            self._revalidation_pending = False
+            self._revalidate_shown_page(self._pending_revalidation_url)
+
+    def _convert_ready_images(self):
+        # Decoding has been done in worker threads, but creating Tk images of many big pictures
+        # can still take a while. Rest of them will be handled after giving Tk a chance to breathe.
+        self._image_conversion_scheduler = None
+        deadline = time.perf_counter() + IMAGE_CONVERSION_SLICE_DURATION
+        while self._ready_images and time.perf_counter() < deadline:
+            url, fut = self._ready_images.popleft()
+            try:
+                decoded = fut.result()
+            except:
+                traceback.print_exc()
+            else:
+                self._update_image(url, decoded)
 
-        self._poll_scheduler = self.after(200, self._poll_provider_responses)
+        if self._ready_images:
+            self._image_conversion_scheduler = self.after(1, self._convert_ready_images)
 
     def init_header(self, row, column):
         header_frame = ttk.Frame(self, style="ViewToolbar.TFrame")
@@ -137,15 +326,107 @@ class ExercisesView(ttk.Frame):
     def _on_request_image(self, url):
         assert url is not None
 
-        if url not in self._image_futures:
-            self._image_futures[url] = self._executor.submit(self._provider.get_image, url)
+        if url not in self._image_futures and url not in self._pending_image_urls:
+            self._pending_image_urls.append(url)
+
+        # Images get requested while the page is being rendered.
+        # Loading order can be decided when their positions are known.
+        if not self._image_loads_scheduled:
+            self._image_loads_scheduled = True
+            self.after_idle(self._start_image_loads)
+
+    def _start_image_loads(self):
+        self._image_loads_scheduled = False
+        if self._destroyed or self._suspended or not self._pending_image_urls:
+            return
+
+        # Requests of abandoned pages don't take a slot (although they may still occupy a thread)
+        shown_urls = set(self._html_widget.get_image_names())
+        free_slots = self._max_image_loads - len([url for url in self._image_futures if url in shown_urls])
+        if free_slots <= 0:
+            return
+
+        # Distances are computed at this moment, so that recent scrolling is taken into account
+        distances = self._html_widget.get_image_distances()
+        self._pending_image_urls.sort(key=lambda url: distances.get(url, float("inf")))
+        for url in self._pending_image_urls[:free_slots]:
+            self._image_futures[url] = self._submit(IMAGE_LANE, IMAGE_TASK, url, self._load_image, url)
+        del self._pending_image_urls[:free_slots]
+
+    def _start_prefetching(self):
+        if self._prefetcher is None or self._suspended or self._history_index < 0:
+            return
+
+        url = self._history[self._history_index].url
+        recent_urls = []
+        for entry in reversed(self._history[:self._history_index]):
+            if len(recent_urls) >= MAX_RECENT_PREFETCHES:
+                break
+            if entry.revisitable and entry.url != url and entry.url not in recent_urls:
+                recent_urls.append(entry.url)
+
+        self._prefetcher.on_page_shown(url, recent_urls)
+
+    def _on_link_hover(self, target):
+        if self._link_hover_scheduler is not None:
+            self.after_cancel(self._link_hover_scheduler)
+            self._link_hover_scheduler = None
+
+        if (target is not None and target.startswith("/")
+                and self._prefetcher is not None and not self._suspended):
+            self._link_hover_scheduler = self.after(int(LINK_HOVER_DELAY * 1000), self._prefetch_hovered, target)
+
+    def _prefetch_hovered(self, target):
+        self._link_hover_scheduler = None
+        self._prefetcher.prefetch(target)
+
+    def _drop_unneeded_image_requests(self):
+        """Forgets requests of images which are not present on current page"""
+        shown_urls = set(self._html_widget.get_image_names())
+        self._pending_image_urls = [url for url in self._pending_image_urls if url in shown_urls]
+        for url, fut in list(self._image_futures.items()):
+            # running ones will be completed and cached
+            if url not in shown_urls and fut.cancel():
+                del self._image_futures[url]
+
+    def _load_image(self, url):
+        # Runs in a worker thread
+        disk_cache = _get_disk_image_cache()
+        cached = disk_cache.get(url)
+        if cached is not None:
+            cached_data, entry = cached
+            if time.time() - entry["checked"] < IMAGE_REVALIDATION_INTERVAL:
+                return _decode_image(cached_data)
+
+            try:
+                data, etag, last_modified = self._provider.get_image_if_modified(
+                    url, entry["etag"], entry["last_modified"])
+            except OSError:
+                # offline, for example
+                traceback.print_exc()
+                return _decode_image(cached_data)
+
+            if data is None:
+                disk_cache.mark_checked(url)
+                return _decode_image(cached_data)
+        else:
+            data, etag, last_modified = self._provider.get_image_if_modified(url)
+
+        decoded = _decode_image(data)
+        disk_cache.put(url, _encode_image(decoded), etag, last_modified)
+        return decoded
 
     def post_button_menu(self):
         self._button_menu.delete(0, "end")
 
+        self._button_menu.add_command(label="Tagasi", command=self.go_back, accelerator="Alt+Left",
+                                      state="normal" if self._can_go(-1) else "disabled")
+        self._button_menu.add_command(label="Edasi", command=self.go_forward, accelerator="Alt+Right",
+                                      state="normal" if self._can_go(1) else "disabled")
+
         items = self._provider.get_menu_items()
-        if not items:
-            return
+        if items:
+            self._button_menu.add_separator()
 
         for label, handler in items:
             if label == "-":
@@ -169,36 +450,143 @@ class ExercisesView(ttk.Frame):
             form_data = FormData()
 
         assert url.startswith("/")
+        if not form_data and self._page_future is not None and self._page_request == (url, False):
+            # repeated click while the page is still loading
+            return
+
+        if not form_data and self._prefetcher is not None:
+            self._prefetcher.on_navigation(url)
+
+        if form_data:
+            # before the page request, which may get cancelled
+            self._provider.accept_form(url, form_data)
+
+        self._save_snapshot()
+
+        if form_data:
+            # Form submissions of pages with sections (eg. exercise) usually change only some sections.
+            # The result replaces current history entry.
+            update_in_place = self._html_widget.has_keyed_sections()
+        else:
+            update_in_place = False
+            del self._history[self._history_index + 1:]
+            self._history.append(HistoryEntry(url, self._provider.is_revisitable(url)))
+            del self._history[:-MAX_HISTORY_LENGTH]
+            self._history_index = len(self._history) - 1
+
+        self._request_page(url, form_data, update_in_place)
+        if update_in_place:
+            self._html_widget.config(cursor="watch")
+
+    def _navigate_on_request(self, url):
+        if self._history_index >= 0 and self._history[self._history_index].url == url:
+            # eg. the page which asked for authentication
+            self._request_page(url, FormData(), False)
+        else:
+            self.go_to(url)
+
+    def go_back(self):
+        self._go_to_history_entry(-1)
+
+    def go_forward(self):
+        self._go_to_history_entry(1)
+
+    def _can_go(self, step):
+        return self._find_history_index(step) is not None
+
+    def _find_history_index(self, step):
+        index = self._history_index + step
+        while 0 <= index < len(self._history):
+            if self._history[index].revisitable:
+                return index
+            index += step
+
+        return None
+
+    def _go_to_history_entry(self, step):
+        index = self._find_history_index(step)
+        if index is None:
+            return
+
+        self._save_snapshot()
+        self._history_index = index
+        entry = self._history[index]
+        if self._prefetcher is not None:
+            self._prefetcher.on_navigation(entry.url)
+
+        if entry.snapshot is None:
+            self._request_page(entry.url, FormData(), False)
+        else:
+            self._show_snapshot(entry.snapshot)
+            # revalidate in the background, page gets redrawn only if something has changed
+            self._request_page(entry.url, FormData(), True)
+
+    def _request_page(self, url, form_data, update_in_place):
         if self._page_future is not None:
+            # has effect only if it hasn't started yet
             self._page_future.cancel()
 
-        self._page_future = self._executor.submit(
-            self._provider.get_html_and_breadcrumbs, url, form_data)
-        self._set_page_html("<p>Palun oota...</p>")
+        self._page_generation += 1
+        self._page_request = None if form_data else (url, update_in_place)
+        max_block_lines = get_workbench().get_option(MAX_BLOCK_LINES_OPTION, DEFAULT_MAX_BLOCK_LINES)
+        self._page_future = self._submit(SUBMISSION_LANE if form_data else NAVIGATION_LANE,
+                                         PAGE_TASK, self._page_generation,
+                                         self._load_page, url, form_data, max_block_lines,
+                                         replace_key=PAGE_TASK)
+        self._page_update_in_place = update_in_place
+        if not update_in_place:
+            # also abandons the rest of progressively rendered previous page
+            self._set_page_html("<p>Palun oota...</p>")
+
+    def _save_snapshot(self):
+        if self._shown_page is None or self._history_index < 0:
+            return
+
+        entry = self._history[self._history_index]
+        if not entry.revisitable:
+            return
+
+        display_list, breadcrumbs = self._shown_page
+        images = {url: _images_by_urls[url] for url in self._html_widget.get_image_names()
+                  if url in _images_by_urls}
+        entry.snapshot = PageSnapshot(display_list, breadcrumbs, self._html_widget.yview()[0], images)
+
+        # keep snapshots of the entries closest to current entry
+        entries_with_snapshots = sorted([i for i, other in enumerate(self._history) if other.snapshot is not None],
+                                        key=lambda i: abs(i - self._history_index))
+        for i in entries_with_snapshots[MAX_HISTORY_SNAPSHOTS:]:
+            self._history[i].snapshot = None
+
+    def _show_snapshot(self, snapshot):
+        # snapshot's images can be given synchronously
+        _images_by_urls.update(snapshot.images_by_urls)
+        self._html_widget.set_display_list(snapshot.display_list)
+        self._html_widget.yview_moveto(snapshot.scroll_offset)
+        self._drop_unneeded_image_requests()
+        self.breadcrumbs_bar.set_links(snapshot.breadcrumbs)
+        self._shown_page = (snapshot.display_list, snapshot.breadcrumbs)
+
+    def _load_page(self, url, form_data, max_block_lines):
+        # Runs in a worker thread, so that UI thread only needs to insert the result
+        html, breadcrumbs = self._provider.get_html_and_breadcrumbs(url, form_data)
+        return parse_html(html, max_block_lines=max_block_lines), breadcrumbs
 
     def _set_page_html(self, html):
         self._html_widget.set_html_content(html)
+        self._shown_page = None
+        self._drop_unneeded_image_requests()
 
-    def _make_tk_image(self, data):
-        try:
-            from PIL import Image
+    def _make_tk_image(self, decoded):
+        if isinstance(decoded, bytes):
+            # PIL is not available
+            return tk.PhotoImage(data=decoded)
+        else:
             from PIL.ImageTk import PhotoImage
-            with BytesIO(data) as fp:
-                fp.seek(0)
-                pil_img = Image.open(fp)
-
-                # Resize while keeping the aspect ratio
-                basewidth = 250
-                wpercent = (basewidth / float(pil_img.size[0]))
-                hsize = int((float(pil_img.size[1]) * float(wpercent)))
-                return PhotoImage(pil_img.resize((basewidth, hsize), Image.ANTIALIAS))
-
-        except ImportError:
-            return tk.PhotoImage(data=data)
+            return PhotoImage(decoded)
 
-    def _update_image(self, url, data):
+    def _update_image(self, url, decoded):
         try:
-            tk_img = self._make_tk_image(data)
+            tk_img = self._make_tk_image(decoded)
         except:
             traceback.print_exc()
             return
@@ -207,17 +595,41 @@ class ExercisesView(ttk.Frame):
         self._html_widget.update_image(url, tk_img)
 
     def destroy(self):
-        if self._poll_scheduler is not None:
+        if self._image_conversion_scheduler is not None:
             try:
-                self.after_cancel(self._poll_scheduler)
-                self._poll_scheduler = None
+                self.after_cancel(self._image_conversion_scheduler)
+                self._image_conversion_scheduler = None
             except:
                 pass
 
+        if self._prefetcher is not None:
+            logger.info(f"Prefetch stats: {self._prefetcher.get_stats()}")
+
+        if self._scheduler is not None:
+            logger.debug(f"Task scheduler stats: {self._scheduler.get_stats()}")
+            self._scheduler.shutdown()
+
         super(ExercisesView, self).destroy()
         self._destroyed = True
 
 
+class HistoryEntry:
+    def __init__(self, url, revisitable):
+        self.url = url
+        self.revisitable = revisitable
+        self.snapshot = None  # type: Optional[PageSnapshot]
+
+
+class PageSnapshot:
+    """Allows showing a previously visited page without waiting for the provider"""
+
+    def __init__(self, display_list, breadcrumbs, scroll_offset, images_by_urls):
+        self.display_list = display_list
+        self.breadcrumbs = breadcrumbs
+        self.scroll_offset = scroll_offset
+        self.images_by_urls = images_by_urls
+
+
 class BreadcrumbsBar(tktextext.TweakableText):
     def __init__(self, master, click_handler):
         super(BreadcrumbsBar, self).__init__(
@@ -304,6 +716,60 @@ class BreadcrumbsBar(tktextext.TweakableText):
         self.tag_remove("_underline", "1.0", "end")
 
 
+def _decode_image(data):
+    """Returns PIL image resized to IMAGE_WIDTH, or original data if PIL is not available.
+
+    Meant to be run in a worker thread, as decoding big pictures is slow.
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return data
+
+    with BytesIO(data) as fp:
+        pil_img = Image.open(fp)
+
+        # Resize while keeping the aspect ratio
+        wpercent = (IMAGE_WIDTH / float(pil_img.size[0]))
+        hsize = max(int((float(pil_img.size[1]) * float(wpercent))), 1)
+
+        # JPEG can be decoded directly at reduced scale (no smaller than requested)
+        pil_img.draft(pil_img.mode, (IMAGE_WIDTH, hsize))
+        pil_img.load()
+
+        # cheap reduction for other formats, leaving some room for the proper resampling
+        factor = pil_img.size[0] // (IMAGE_WIDTH * 2)
+        if factor >= 2:
+            if pil_img.mode == "P":
+                # eg. GIF or palette PNG. Can't be reduced, and nearest resampling would be ugly.
+                pil_img = pil_img.convert("RGBA")
+            try:
+                pil_img = pil_img.reduce(factor)
+            except ValueError:
+                # mode not supported by reduce (eg. "1" or "I;16"), resize can handle it
+                pass
+
+        if pil_img.size == (IMAGE_WIDTH, hsize):
+            # already downscaled (eg. coming from the disk cache)
+            return pil_img
+
+        return pil_img.resize((IMAGE_WIDTH, hsize), Image.LANCZOS)
+
+
+def _encode_image(decoded):
+    """Returns bytes of an image produced by _decode_image, for storing in the disk cache"""
+    if isinstance(decoded, bytes):
+        return decoded
+
+    if decoded.mode not in ("1", "L", "LA", "P", "RGB", "RGBA"):
+        # eg. CMYK JPEG
+        decoded = decoded.convert("RGBA")
+
+    with BytesIO() as fp:
+        decoded.save(fp, format="PNG")
+        return fp.getvalue()
+
+
 class ExerciseHtmlRenderer(HtmlRenderer):
     def _expand_field_value(self, value_holder, attrs):
         if attrs["type"] == "hidden" and attrs["name"] == EDITOR_CONTENT_NAME:
@@ -333,11 +799,68 @@ class ExerciseProvider:
         raise NotImplementedError()
 
     def get_image(self, url) -> bytes:
-        return urlopen(url).read()
+        return self.get_image_if_modified(url)[0]
+
+    def get_image_if_modified(self, url, etag: Optional[str] = None,
+                              last_modified: Optional[str] = None) -> Tuple[Optional[bytes], Optional[str], Optional[str]]:
+        """Returns image data together with its new validators (ETag and Last-Modified).
+
+        Data is None if the image hasn't changed since the given validators were received.
+        """
+        from urllib.error import HTTPError
+        from urllib.request import urlopen, Request
+
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        try:
+            with urlopen(Request(url, headers=headers)) as fp:
+                return fp.read(), fp.headers.get("ETag"), fp.headers.get("Last-Modified")
+        except HTTPError as e:
+            if e.code == 304:
+                return None, etag, last_modified
+            raise
 
     def get_max_threads(self) -> int:
         return 10
 
+    def suspend(self) -> None:
+        """Called in UI thread, when the view has been hidden for a while.
+        Background activity (polling, retries etc.) should pause until resume."""
+        pass
+
+    def resume(self) -> None:
+        """Called in UI thread, when suspended view gets shown again"""
+        pass
+
+    def accept_form(self, url: str, form_data: FormData) -> None:
+        """Called in UI thread, when a form gets submitted, before its page is requested.
+
+        Work which must not get lost if the student goes elsewhere before the page has loaded
+        (eg. saving a submission) should be done here. Must be quick.
+        """
+        pass
+
+    def is_prefetchable(self, url: str) -> bool:
+        """Whether loading the url in advance is safe and worthwhile"""
+        return False
+
+    def get_prefetch_urls(self, url: str) -> List[str]:
+        """Urls of pages the student is likely to open after this page. Called in a worker thread."""
+        return []
+
+    def prefetch(self, url: str) -> List[str]:
+        """Loads the page in order to warm the caches. Returns urls of its images. Called in a worker thread."""
+        html, _ = self.get_html_and_breadcrumbs(url, FormData())
+        return parse_html(html).get_image_urls()
+
+    def is_revisitable(self, url: str) -> bool:
+        """Whether the url can be requested again (without form data) when user navigates back or forward"""
+        return True
+
     def get_menu_items(self) -> List[Tuple[str, Union[str, Callable, None]]]:
         """
         This will be called each time the user clicks on the menu button.
@@ -0,0 +1,150 @@
+import json
+import logging
+import os.path
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PYPI_URL = "https://pypi.org/pypi/thonny-lahendus/json"
+PYPI_TIMEOUT_SECONDS = 5
+CHECK_INTERVAL_SECONDS = 60 * 60
+# Random delay added to each check, so that a whole class doesn't check at the same moment
+CHECK_JITTER_SECONDS = 10 * 60
+
+
+class UpdateChecker:
+    """Checks in the background whether the plug-in needs to be updated.
+
+    The latest version is stored in a file together with the time of next check,
+    so that the schedule survives restarts. It gets compared to the installed version when read,
+    so that the verdict changes as soon as the student has updated the plug-in.
+    """
+
+    def __init__(self, state_path):
+        self._state_path = state_path
+        self._lock = threading.Lock()
+        self._checking = False
+        self._suspended = False
+        self._state = self._load_state()
+        # Read when first needed. Updated plug-in is loaded only by a new Thonny process anyway.
+        self._installed_version = None
+
+    def is_update_required(self) -> bool:
+        self.start_check_if_due()
+        versions = self.get_versions()
+        if versions["current"] is None or versions["latest"] is None:
+            return False
+
+        try:
+            return _is_update_required(versions)
+        except ValueError as e:
+            logger.warning(f"Could not compare plug-in versions {versions}: '{e}'")
+            return False
+
+    def get_versions(self):
+        with self._lock:
+            if self._installed_version is None:
+                try:
+                    self._installed_version = _get_installed_version()
+                except Exception as e:
+                    # eg. running from source
+                    logger.warning(f"Could not get installed plug-in version: '{e}'")
+                    self._installed_version = ""
+            return {"current": self._installed_version or None, "latest": self._state.get("latest")}
+
+    def suspend(self):
+        """Postpones checks until resume"""
+        with self._lock:
+            self._suspended = True
+
+    def resume(self):
+        with self._lock:
+            self._suspended = False
+        self.start_check_if_due()
+
+    def start_check_if_due(self):
+        with self._lock:
+            if self._checking or self._suspended:
+                return
+
+            next_check = self._state.get("next_check")
+            if next_check is None:
+                # First check ever. Don't let a class of freshly set up computers check at the same time.
+                delay = random.uniform(0, CHECK_JITTER_SECONDS)
+            elif time.time() >= next_check:
+                delay = 0
+            else:
+                return
+
+            self._checking = True
+
+        threading.Thread(target=self._check, args=(delay,), daemon=True).start()
+
+    def _check(self, delay):
+        time.sleep(delay)
+        with self._lock:
+            if self._suspended:
+                # started again by resume
+                self._checking = False
+                return
+
+        try:
+            logger.info("Checking for plug-in update...")
+            state = {"latest": _get_latest_version()}
+            logger.info(f"Latest plug-in version: {state['latest']}")
+        except Exception as e:
+            # eg. offline. Keep the previous version.
+            logger.info(f"Could not check for plug-in update: '{e}'")
+            state = dict(self._state)
+
+        state["checked"] = time.time()
+        state["next_check"] = state["checked"] + CHECK_INTERVAL_SECONDS + random.uniform(0, CHECK_JITTER_SECONDS)
+
+        with self._lock:
+            self._state = state
+            self._checking = False
+
+        self._save_state(state)
+
+    def _load_state(self):
+        try:
+            with open(self._state_path, encoding="UTF-8") as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self, state):
+        temp_path = "%s.%d.tmp" % (self._state_path, os.getpid())
+        try:
+            with open(temp_path, "w", encoding="UTF-8") as fp:
+                json.dump(state, fp)
+            os.replace(temp_path, self._state_path)
+        except OSError as e:
+            logger.warning(f"Could not save update check state: '{e}'")
+
+
+def _get_installed_version():
+    try:
+        from importlib.metadata import version
+    except ImportError:
+        # Python 3.7
+        import pkg_resources
+        return pkg_resources.require("thonny-lahendus")[0].version
+
+    return version("thonny-lahendus")
+
+
+def _get_latest_version():
+    import requests
+
+    resp: requests.Response = requests.get(PYPI_URL, timeout=PYPI_TIMEOUT_SECONDS)
+    resp.raise_for_status()
+    return resp.json()["info"]["version"]
+
+
+def _is_update_required(versions):
+    major_installed = int(versions["current"].split(".")[0])
+    major_latest = int(versions["latest"].split(".")[0])
+    return major_installed < major_latest
@@ -0,0 +1,23 @@
+from thonnycontrib.easy.ui import ExercisesView
+
+
+class EasyExercisesView(ExercisesView):
+    def __init__(self, master):
+        super(EasyExercisesView, self).__init__(master, _create_easy_provider)
+
+
+class DemoExercisesView(ExercisesView):
+    def __init__(self, master):
+        super(DemoExercisesView, self).__init__(master, _create_demo_provider)
+
+
+# Provider modules (with their dependencies) get imported only when the view is first shown
+
+def _create_easy_provider(exercises_view):
+    from thonnycontrib.easy.easy_provider import EasyExerciseProvider
+    return EasyExerciseProvider(exercises_view)
+
+
+def _create_demo_provider(exercises_view):
+    from thonnycontrib.easy.demo_exercise_provider import DemoExerciseProvider
+    return DemoExerciseProvider(exercises_view)